@@ -0,0 +1,243 @@
+#!/usr/bin/env python3
+
+"""
+cwidgets benchmark script.
+
+Builds synthetic widget hierarchies (patterned on the debugging UI of the
+cwidgets module) of configurable depth and width, times the hot paths of
+the library on a headless backend, and reports the results as JSON so that
+runs can be compared.
+"""
+
+import sys, time, json, argparse
+import curses
+
+from cwidgets import *
+
+try:
+    clock = time.perf_counter
+except AttributeError:
+    clock = time.time
+
+BENCHMARKS = ('cold_make', 'relayout', 'full_redraw', 'partial_redraw',
+              'input')
+
+INPUT_KEYS = [ord('\t')] + [ord(c) for c in 'lorem ipsum\n'] + \
+    [curses.KEY_LEFT, curses.KEY_RIGHT, curses.KEY_UP, curses.KEY_DOWN,
+     curses.KEY_BACKSPACE, curses.KEY_BACKSPACE, ord(' ')]
+
+def make_leaf(parent, index, **config):
+    "Add the index-th leaf widget (cycling through various kinds) to parent"
+    kind = index % 7
+    if kind == 0:
+        return parent.add(Button('button %d' % index, None), **config)
+    elif kind == 1:
+        return parent.add(CheckBox('check %d' % index), **config)
+    elif kind == 2:
+        return parent.add(Label('label %d\nwith a second line' % index),
+                          **config)
+    elif kind == 3:
+        return parent.add(EntryBox('entry %d' % index, multiline=True,
+                                   cminsize=(20, 3), cmaxsize=(40, 6)),
+                          **config)
+    elif kind == 4:
+        return parent.add(Spinner(0, 10, 1), **config)
+    elif kind == 5:
+        grid = parent.add(GridContainer(mode_x=LinearContainer.MODE_EQUAL),
+                          **config)
+        for y in range(3):
+            for x in range(3):
+                grid.add(Label('[%d,%d]' % (x, y)), pos=(x, y))
+        grid.config_col(1, weight=1)
+        return grid
+    else:
+        return parent.add(Slider(0, 10, 1), **config)
+
+def make_branch(parent, depth, width, counter):
+    """
+    Add a (sub-)tree of the given depth with width children per node
+
+    parent is the container to add the tree to (it must already be part of
+    a hierarchy for styling to work); counter is a one-element list used to
+    number the leaves.
+    """
+    if depth % 2:
+        cont = parent.add(HorizontalContainer())
+    else:
+        cont = parent.add(VerticalContainer())
+    for i in range(width):
+        if depth == 0:
+            counter[0] += 1
+            make_leaf(cont, counter[0], weight=i % 2)
+            continue
+        box = cont.add(MarginContainer(border=True), weight=1)
+        top = box.add(TeeContainer(), slot=MarginContainer.POS_TOP)
+        top.add(Label('section %d/%d' % (depth, i)))
+        make_branch(box, depth - 1, width, counter)
+    return cont
+
+def make_root(backend, depth, width):
+    "Create a WidgetRoot hosting a synthetic tree on a fresh screen"
+    root = WidgetRoot(backend.initscr())
+    root.styler = ClassStyler(do_colors=True)
+    root.styler.add_style(Widget, background=('white', 'blue'),
+                          default=('black', 'white'))
+    root.styler.add_style(Focusable, default=('red', 'white'),
+                          highlight=('black', 'red'), focus=('white', 'red'))
+    root.styler.add_style(EntryBox, default=('white', 'blue'),
+                          focus=('black', 'white'))
+    vp = root.add(Viewport())
+    make_branch(vp, depth, width, [0])
+    return root
+
+def iter_widgets(widget):
+    "Yield widget and all its (recursive) children"
+    yield widget
+    for c in getattr(widget, 'children', ()):
+        for w in iter_widgets(c):
+            yield w
+
+def leaves(root):
+    "Return a list of the childless widgets of the hierarchy of root"
+    return [w for w in iter_widgets(root.widget)
+            if not getattr(w, 'children', None)]
+
+def percentile(values, p):
+    "Return the p-th percentile of the sorted list values (nearest rank)"
+    if not values: return None
+    idx = int(round(p / 100.0 * len(values))) - 1
+    idx = max(0, min(len(values) - 1, idx))
+    return values[idx]
+
+def summarize(samples):
+    "Reduce a list of per-call durations (in seconds) to statistics"
+    samples = sorted(samples)
+    total = sum(samples)
+    us = lambda v: round(v * 1e6, 3)
+    return {'calls': len(samples),
+            'total_s': round(total, 6),
+            'ops_per_sec': round(len(samples) / total, 3) if total else None,
+            'latency_us': {'min': us(samples[0]),
+                           'mean': us(total / len(samples)),
+                           'p50': us(percentile(samples, 50)),
+                           'p90': us(percentile(samples, 90)),
+                           'p99': us(percentile(samples, 99)),
+                           'max': us(samples[-1])}}
+
+def bench_cold_make(args, backend):
+    "Time make() on freshly built hierarchies"
+    samples = []
+    for n in range(args.warmup + args.repeat):
+        root = make_root(backend, args.depth, args.width)
+        t = clock()
+        root.make()
+        d = clock() - t
+        if n >= args.warmup: samples.append(d)
+    return samples
+
+def bench_relayout(args, backend):
+    "Time invalidate_layout() on a leaf and the subsequent make()"
+    root = make_root(backend, args.depth, args.width)
+    root.update()
+    targets = leaves(root)
+    samples = []
+    for n in range(args.warmup + args.repeat):
+        w = targets[n % len(targets)]
+        t = clock()
+        w.invalidate_layout()
+        root.make()
+        d = clock() - t
+        if n >= args.warmup: samples.append(d)
+        root.update()
+    return samples
+
+def bench_full_redraw(args, backend):
+    "Time redrawing the whole hierarchy"
+    root = make_root(backend, args.depth, args.width)
+    root.update()
+    samples = []
+    for n in range(args.warmup + args.repeat):
+        t = clock()
+        root.invalidate(True)
+        # The Viewport does not pass recursive invalidations on to its
+        # (offscreen) content.
+        root.widget.children[0].invalidate(True)
+        root.redraw()
+        d = clock() - t
+        if n >= args.warmup: samples.append(d)
+    return samples
+
+def bench_partial_redraw(args, backend):
+    "Time redrawing after invalidating a single leaf"
+    root = make_root(backend, args.depth, args.width)
+    root.update()
+    targets = leaves(root)
+    samples = []
+    for n in range(args.warmup + args.repeat):
+        w = targets[n % len(targets)]
+        t = clock()
+        w.invalidate()
+        root.redraw()
+        d = clock() - t
+        if n >= args.warmup: samples.append(d)
+    return samples
+
+def bench_input(args, backend):
+    "Time processing keystrokes via WidgetRoot._process_input()"
+    root = make_root(backend, args.depth, args.width)
+    root.update()
+    samples = []
+    for n in range(args.warmup + args.repeat * len(INPUT_KEYS)):
+        key = INPUT_KEYS[n % len(INPUT_KEYS)]
+        t = clock()
+        root._process_input(key)
+        d = clock() - t
+        if n >= args.warmup: samples.append(d)
+        root.update()
+    return samples
+
+def parse_size(s):
+    "Parse a WIDTHxHEIGHT specification"
+    try:
+        w, h = s.lower().split('x')
+        return (int(w), int(h))
+    except ValueError:
+        raise argparse.ArgumentTypeError('Invalid size: %r' % (s,))
+
+def main():
+    p = argparse.ArgumentParser(description='Benchmark cwidgets.')
+    p.add_argument('--depth', type=int, default=2,
+                   help='nesting depth of the widget tree (default 2)')
+    p.add_argument('--width', type=int, default=3,
+                   help='children per container (default 3)')
+    p.add_argument('--size', type=parse_size, default=(120, 40),
+                   help='screen size as WIDTHxHEIGHT (default 120x40)')
+    p.add_argument('--repeat', type=int, default=50,
+                   help='timed iterations per benchmark (default 50)')
+    p.add_argument('--warmup', type=int, default=5,
+                   help='untimed iterations per benchmark (default 5)')
+    p.add_argument('--only', action='append', choices=BENCHMARKS,
+                   help='run only the given benchmark (may be repeated)')
+    p.add_argument('--output', '-o', help='write the report to this file')
+    args = p.parse_args()
+    backend = HeadlessBackend(args.size)
+    init(backend)
+    report = {'config': {'depth': args.depth, 'width': args.width,
+                         'size': list(args.size), 'repeat': args.repeat,
+                         'warmup': args.warmup},
+              'python': sys.version.split()[0],
+              'widgets': sum(1 for w in iter_widgets(
+                  make_root(backend, args.depth, args.width).widget)),
+              'results': {}}
+    for name in BENCHMARKS:
+        if args.only and name not in args.only: continue
+        func = globals()['bench_' + name]
+        report['results'][name] = summarize(func(args, backend))
+    data = json.dumps(report, indent=2, sort_keys=True)
+    if args.output:
+        with open(args.output, 'w') as f:
+            f.write(data + '\n')
+    else:
+        print(data)
+
+if __name__ == '__main__': main()
@@ -67,9 +67,20 @@ A typical use (demonstrated on a dialog window) would look like this:
 ... root.main()
 """
 
+import os as _os
 import sys as _sys
 import time as _time
+import errno as _errno
+import fcntl as _fcntl
+import select as _select
+import threading as _threading
+import itertools as _itertools
+import mmap as _mmap
+import weakref as _weakref
+import collections as _collections
 import curses as _curses
+import array as _array
+import bisect as _bisect
 import codecs as _codecs
 import locale as _locale
 
@@ -79,11 +90,18 @@ _KEY_TAB = ord('\t')
 
 _LOG = []
 
+# Pad used by scroll_window() to stage the rows being shifted.
+_SCRATCH = None
+
+_clock = getattr(_time, 'perf_counter', _time.time)
+
 if _sys.version_info[0] <= 2:
     _bchr = chr
+    _unichr = unichr
     _unicode = unicode
 else:
     _bchr = lambda x: bytes([x])
+    _unichr = chr
     _unicode = str
 
 def zbound(v, m):
@@ -114,6 +132,27 @@ def intersectrect(r, b):
     br = (min(r[0] + r[2], bbr[0]), min(r[1] + r[3], bbr[1]))
     return (min(pos[0], bbr[0]), min(pos[1], bbr[1]),
             max(br[0] - pos[0], 0), max(br[1] - pos[1], 0))
+def unionrect(r, b):
+    """
+    Return the smallest rect containing both r and b
+
+    Either of r and b may be None, denoting no rect at all.
+    """
+    if r is None: return b
+    if b is None: return r
+    x, y = min(r[0], b[0]), min(r[1], b[1])
+    return (x, y, max(r[0] + r[2], b[0] + b[2]) - x,
+            max(r[1] + r[3], b[1] + b[3]) - y)
+def overlaprect(r, b):
+    """
+    Return whether the rects r and b have any area in common
+
+    If either of them is None (denoting an unknown rect), the result is
+    True.
+    """
+    if r is None or b is None: return True
+    return (r[0] < b[0] + b[2] and b[0] < r[0] + r[2] and
+            r[1] < b[1] + b[3] and b[1] < r[1] + r[3])
 
 def linear_distrib(full, amnt):
     "Return a list of amnt approximately equal integers summing up to full"
@@ -154,6 +193,66 @@ def weight_distrib(full, weights):
     assert sum(r) == full, 'weight_distrib() failed'
     return r
 
+# The layout kernels below are plain loops over Python lists. NumPy versions
+# of them are no faster even for tens of thousands of items, as converting
+# the columns to and from arrays costs as much as the loops themselves.
+
+def group_indices(advances):
+    """
+    Return the group index of every item and the indices where groups start
+
+    A new group starts at every item whose advance is nonzero, as well as
+    at the very first item. The return value is a (indices, starts) tuple.
+    """
+    indices, starts = [], []
+    for n, a in enumerate(advances):
+        if a or not starts: starts.append(n)
+        indices.append(len(starts) - 1)
+    return (indices, starts)
+
+def group_max(indices, values, length):
+    """
+    Return a list of the maxima of values grouped by indices
+
+    The result has length items; the i-th of them is the maximum of zero and
+    all values whose corresponding indices entry is i.
+    """
+    ret = [0] * length
+    for i, v in zip(indices, values):
+        if v > ret[i]: ret[i] = v
+    return ret
+
+def prefix_offsets(sizes, advances=None):
+    """
+    Return the offsets at which a sequence of items of sizes starts
+
+    The i-th result is the sum of all sizes before the i-th one, each
+    multiplied with the corresponding entry of advances (if given).
+    """
+    ret, cp = [], 0
+    if advances is None:
+        for s in sizes:
+            ret.append(cp)
+            cp += s
+    else:
+        for s, a in zip(sizes, advances):
+            ret.append(cp)
+            cp += s * a
+    return ret
+
+def extent(sizes, advances):
+    """
+    Return the total extent of a sequence of items of sizes
+
+    The items are placed as by prefix_offsets(); the result is the maximum of
+    zero and the ends of all items.
+    """
+    ret, cp = 0, 0
+    for s, a in zip(sizes, advances):
+        if cp + s > ret: ret = cp + s
+        cp += s * a
+    return ret
+
 def parse_pair(v, default=(None, None)):
     """
     Expand a scalar or 2-tuple into a 2-tuple
@@ -504,6 +603,872 @@ class Scrollable:
         if self.scrollbars['horiz']:
             self.scrollbars['horiz'].update()
 
+class CursesBackend(object):
+    """
+    The screen backend drawing to an actual terminal using curses
+
+    Backends provide the module-level curses functions and constants cwidgets
+    uses (like newpad(), color_pair(), or ACS_HLINE); this one simply forwards
+    everything to the curses module.
+    """
+    def __getattr__(self, name):
+        value = getattr(_curses, name)
+        # The ACS_* constants are only defined by initscr(), but then stay
+        # fixed; as they are looked up whenever lines are drawn, they are
+        # remembered (while, e.g., LINES and COLS must not be).
+        if name.startswith('ACS_'): setattr(self, name, value)
+        return value
+
+class HeadlessWindow(object):
+    """
+    An in-memory emulation of a curses window or pad
+
+    Only the subset of the curses window interface used by cwidgets is
+    implemented. Characters are stored as code points, along with their
+    attributes, in flat arrays; subwindows created by derwin() share the
+    buffers of their parent.
+
+    Attributes are:
+    backend: The HeadlessBackend this window belongs to.
+    parent : The window this one was derived from, or None.
+    begin  : The (y, x) position of this window relative to its parent.
+    """
+    def __init__(self, backend, height, width, parent=None, begin=(0, 0)):
+        """
+        Initializer
+
+        backend is the HeadlessBackend the window belongs to; height and
+        width specify its size; parent is the window this one is derived
+        from (if any) and begin is the offset of this one inside that.
+        """
+        self.backend = backend
+        self.parent = parent
+        self.begin = begin
+        self._height = height
+        self._width = width
+        self._pos = (0, 0)
+        self._bkgd = (32, 0)
+        self._nodelay = False
+        self._scrollok = False
+        self._scrreg = None
+        if parent is None:
+            self._stride = width
+            self._offset = 0
+            self._chars = _array.array('L', (32,)) * (height * width)
+            self._attrs = _array.array('L', (0,)) * (height * width)
+        else:
+            self._stride = parent._stride
+            self._offset = (parent._offset + begin[0] * parent._stride +
+                            begin[1])
+            self._chars = parent._chars
+            self._attrs = parent._attrs
+            self._bkgd = parent._bkgd
+    def _index(self, y, x):
+        "Return the buffer index of the given cell"
+        if not (0 <= y < self._height and 0 <= x < self._width):
+            raise _curses.error('position out of window')
+        return self._offset + y * self._stride + x
+    def _split(self, ch, attr=0):
+        "Split a character (with or without attributes) into code and attrs"
+        if isinstance(ch, bytes):
+            ch = ch.decode(_ENCODING or 'latin-1')
+        if isinstance(ch, _unicode):
+            return (ord(ch), attr)
+        return (ch & _curses.A_CHARTEXT, (ch & ~_curses.A_CHARTEXT) | attr)
+    def _render(self, code, attr):
+        "Combine a character with the window's background like curses does"
+        if code == 32 and attr == 0:
+            return self._bkgd
+        battr = self._bkgd[1]
+        if attr & _curses.A_COLOR:
+            battr &= ~_curses.A_COLOR
+        return (code, attr | battr)
+    def _put(self, y, x, code, attr):
+        "Store a rendered character into the given cell"
+        idx = self._index(y, x)
+        self._chars[idx], self._attrs[idx] = self._render(code, attr)
+    def _put_run(self, y, x, codes, attr):
+        """
+        Store a run of rendered characters into the given row
+
+        The run must fit into the row.
+        """
+        idx, n = self._index(y, x), len(codes)
+        bcode, battr = self._bkgd
+        if attr & _curses.A_COLOR: battr &= ~_curses.A_COLOR
+        if attr == 0 and 32 in codes:
+            chars = [bcode if c == 32 else c for c in codes]
+            attrs = [battr if c == 32 else attr | battr for c in codes]
+            self._chars[idx:idx + n] = _array.array('L', chars)
+            self._attrs[idx:idx + n] = _array.array('L', attrs)
+        else:
+            self._chars[idx:idx + n] = _array.array('L', codes)
+            self._attrs[idx:idx + n] = _array.array('L', (attr | battr,)) * n
+    def _args(self, args, count):
+        """
+        Strip an optional leading (y, x) pair from args, moving there
+
+        count is the maximum amount of arguments without the pair.
+        """
+        if len(args) > count:
+            self.move(args[0], args[1])
+            return args[2:]
+        return args
+    def _write(self, codes, attr):
+        "Write characters at the cursor, advancing (and wrapping) it"
+        y, x = self._pos
+        if codes and x + len(codes) <= self._width and 10 not in codes:
+            # Fast path: the text fits into the current line.
+            self._put_run(y, x, codes, attr)
+            x += len(codes)
+            if x < self._width:
+                self._pos = (y, x)
+            elif y + 1 < self._height:
+                self._pos = (y + 1, 0)
+            else:
+                self._pos = (y, x - 1)
+                raise _curses.error('write past end of window')
+            return
+        for code in codes:
+            if code == 10:
+                for cx in range(x, self._width):
+                    self._put(y, cx, 32, attr)
+                y, x = y + 1, 0
+                if y >= self._height:
+                    self._pos = (self._height - 1, 0)
+                    raise _curses.error('write past end of window')
+                continue
+            self._put(y, x, code, attr)
+            x += 1
+            if x >= self._width:
+                y, x = y + 1, 0
+                if y >= self._height:
+                    self._pos = (self._height - 1, self._width - 1)
+                    raise _curses.error('write past end of window')
+        self._pos = (y, x)
+    def _insert(self, codes, attr):
+        "Insert characters at the cursor, shifting the rest of the line"
+        y, x = self._pos
+        start = self._index(y, x)
+        end = self._index(y, self._width - 1) + 1
+        n = min(len(codes), end - start)
+        if n == 0: return
+        chars, attrs = self._chars, self._attrs
+        chars[start + n:end] = chars[start:end - n]
+        attrs[start + n:end] = attrs[start:end - n]
+        for i, code in enumerate(codes[:n]):
+            chars[start + i], attrs[start + i] = self._render(code, attr)
+    def _codes(self, text):
+        "Convert text (a str or a bytes object) to a list of code points"
+        if isinstance(text, bytes):
+            text = text.decode(_ENCODING or 'latin-1')
+        return [ord(c) for c in text]
+    def getmaxyx(self):
+        "Return the size of this window as a (height, width) tuple"
+        return (self._height, self._width)
+    def getbegyx(self):
+        "Return the position of this window relative to its parent"
+        return self.begin
+    def getyx(self):
+        "Return the cursor position"
+        return self._pos
+    def move(self, y, x):
+        "Move the cursor"
+        self._index(y, x)
+        self._pos = (y, x)
+    def derwin(self, *args):
+        """
+        Create a subwindow sharing this window's contents
+
+        Accepts (begin_y, begin_x) or (nlines, ncols, begin_y, begin_x); a
+        nlines or ncols of zero extends the subwindow to the lower or right
+        edge.
+        """
+        if len(args) == 2:
+            nlines, ncols, by, bx = 0, 0, args[0], args[1]
+        else:
+            nlines, ncols, by, bx = args
+        if nlines == 0: nlines = self._height - by
+        if ncols == 0: ncols = self._width - bx
+        if (by < 0 or bx < 0 or nlines <= 0 or ncols <= 0 or
+                by + nlines > self._height or bx + ncols > self._width):
+            raise _curses.error('derwin() returned NULL')
+        return HeadlessWindow(self.backend, nlines, ncols, self, (by, bx))
+    def bkgd(self, ch, attr=0):
+        """
+        Set the background and apply it to the whole window
+
+        Blank cells (i.e. those holding the old background character) are
+        changed to the new one; the old background attributes are replaced
+        by the new ones.
+        """
+        code, attr = self._split(ch, attr)
+        if code == 0: code = 32
+        oldcode, oldattr = self._bkgd
+        self._bkgd = (code, attr)
+        chars, attrs, w = self._chars, self._attrs, self._width
+        for y in range(self._height):
+            base = self._offset + y * self._stride
+            rc, ra = chars[base:base + w], attrs[base:base + w]
+            if rc.count(oldcode) == w:
+                chars[base:base + w] = _array.array('L', (code,)) * w
+            elif oldcode in rc:
+                chars[base:base + w] = _array.array('L',
+                    [code if c == oldcode else c for c in rc])
+            if ra.count(ra[0]) == w:
+                attrs[base:base + w] = _array.array('L',
+                    ((ra[0] & ~oldattr) | attr,)) * w
+            else:
+                attrs[base:base + w] = _array.array('L',
+                    [(a & ~oldattr) | attr for a in ra])
+    def clear(self):
+        "Fill the window with its background"
+        code, attr = self._bkgd
+        w = self._width
+        crow = _array.array('L', (code,)) * w
+        arow = _array.array('L', (attr,)) * w
+        for y in range(self._height):
+            base = self._offset + y * self._stride
+            self._chars[base:base + w] = crow
+            self._attrs[base:base + w] = arow
+        self._pos = (0, 0)
+    erase = clear
+    def addch(self, *args):
+        "Write a single character, advancing the cursor"
+        args = self._args(args, 2)
+        code, attr = self._split(*args)
+        self._write((code,), attr)
+    def insch(self, *args):
+        "Insert a single character, shifting the rest of the line right"
+        args = self._args(args, 2)
+        code, attr = self._split(*args)
+        self._insert((code,), attr)
+    def addstr(self, *args):
+        "Write a string, advancing the cursor"
+        args = self._args(args, 2)
+        attr = args[1] if len(args) > 1 else 0
+        self._write(self._codes(args[0]), attr)
+    def insstr(self, *args):
+        "Insert a string, shifting the rest of the line right"
+        args = self._args(args, 2)
+        attr = args[1] if len(args) > 1 else 0
+        self._insert(self._codes(args[0]), attr)
+    def hline(self, *args):
+        "Draw a horizontal line of at most n characters"
+        args = self._args(args, 3)
+        code, attr = self._split(args[0], *args[2:])
+        y, x = self._pos
+        n = min(x + args[1], self._width) - x
+        if n > 0: self._put_run(y, x, [code] * n, attr)
+    def vline(self, *args):
+        "Draw a vertical line of at most n characters"
+        args = self._args(args, 3)
+        code, attr = self._split(args[0], *args[2:])
+        y, x = self._pos
+        for cy in range(y, min(y + args[1], self._height)):
+            self._put(cy, x, code, attr)
+    def border(self, ls=0, rs=0, ts=0, bs=0, tl=0, tr=0, bl=0, br=0):
+        "Draw a border around the edges of the window"
+        b = self.backend
+        ls, rs = ls or b.ACS_VLINE, rs or b.ACS_VLINE
+        ts, bs = ts or b.ACS_HLINE, bs or b.ACS_HLINE
+        tl, tr = tl or b.ACS_ULCORNER, tr or b.ACS_URCORNER
+        bl, br = bl or b.ACS_LLCORNER, br or b.ACS_LRCORNER
+        h, w = self._height, self._width
+        if w > 2:
+            self._put_run(0, 1, [self._split(ts)[0]] * (w - 2),
+                          self._split(ts)[1])
+            self._put_run(h - 1, 1, [self._split(bs)[0]] * (w - 2),
+                          self._split(bs)[1])
+        for y in range(1, h - 1):
+            self._put(y, 0, *self._split(ls))
+            self._put(y, w - 1, *self._split(rs))
+        self._put(0, 0, *self._split(tl))
+        self._put(0, w - 1, *self._split(tr))
+        self._put(h - 1, 0, *self._split(bl))
+        self._put(h - 1, w - 1, *self._split(br))
+    def inch(self, y, x):
+        "Return the character and attributes at the given position"
+        idx = self._index(y, x)
+        return self._chars[idx] | self._attrs[idx]
+    def instr(self, y, x, n=None):
+        "Return (at most n) characters starting at the given position"
+        idx = self._index(y, x)
+        if n is None: n = self._width - x
+        n = min(n, self._width - x)
+        return ''.join(_unichr(c) for c in self._chars[idx:idx + n])
+    def overwrite(self, dest, *args):
+        """
+        Copy (a region of) this window onto dest
+
+        Accepts either no further arguments (in which case the overlapping
+        region anchored at the top-left corners is copied), or sminrow,
+        smincol, dminrow, dmincol, dmaxrow, dmaxcol as curses does.
+        """
+        if args:
+            sy, sx, dy, dx, dmy, dmx = args
+        else:
+            sy, sx, dy, dx = 0, 0, 0, 0
+            dmy = min(self._height, dest._height) - 1
+            dmx = min(self._width, dest._width) - 1
+        h, w = dmy - dy + 1, dmx - dx + 1
+        if (h <= 0 or w <= 0 or sy < 0 or sx < 0 or dy < 0 or dx < 0 or
+                sy + h > self._height or sx + w > self._width or
+                dmy >= dest._height or dmx >= dest._width):
+            raise _curses.error('copywin() returned ERR')
+        for y in range(h):
+            sidx = self._offset + (sy + y) * self._stride + sx
+            didx = dest._offset + (dy + y) * dest._stride + dx
+            dest._chars[didx:didx + w] = self._chars[sidx:sidx + w]
+            dest._attrs[didx:didx + w] = self._attrs[sidx:sidx + w]
+    def resize(self, nlines, ncols):
+        """
+        Change the size of this window, preserving the overlapping content
+
+        Subwindows keep sharing the buffers of their parent, and must stay
+        within it.
+        """
+        if nlines <= 0 or ncols <= 0:
+            raise _curses.error('wresize() returned ERR')
+        if self.parent is not None:
+            by, bx = self.begin
+            if (by + nlines > self.parent._height or
+                    bx + ncols > self.parent._width):
+                raise _curses.error('wresize() returned ERR')
+            self._height, self._width = nlines, ncols
+            self._scrreg = None
+            self._pos = minpos(self._pos, (nlines - 1, ncols - 1))
+            return
+        code, attr = self._bkgd
+        chars = _array.array('L', (code,)) * (nlines * ncols)
+        attrs = _array.array('L', (attr,)) * (nlines * ncols)
+        w = min(ncols, self._width)
+        for y in range(min(nlines, self._height)):
+            chars[y * ncols:y * ncols + w] = \
+                self._chars[y * self._stride:y * self._stride + w]
+            attrs[y * ncols:y * ncols + w] = \
+                self._attrs[y * self._stride:y * self._stride + w]
+        self._chars, self._attrs = chars, attrs
+        self._height, self._width, self._stride = nlines, ncols, ncols
+        self._scrreg = None
+        self._pos = minpos(self._pos, (nlines - 1, ncols - 1))
+    def scrollok(self, flag):
+        "Set whether scroll() is allowed"
+        self._scrollok = bool(flag)
+    def setscrreg(self, top, bottom):
+        "Restrict scroll() to the lines from top to bottom (inclusively)"
+        if not 0 <= top <= bottom < self._height:
+            raise _curses.error('wsetscrreg() returned ERR')
+        self._scrreg = (top, bottom)
+    def scroll(self, n=1):
+        """
+        Scroll the contents of this window (or of its scrolling region) up
+        by n lines
+
+        A negative n scrolls down; the lines scrolled in are filled with the
+        background.
+        """
+        if not self._scrollok:
+            raise _curses.error('scroll() returned ERR')
+        top, bottom = self._scrreg or (0, self._height - 1)
+        w, stride = self._width, self._stride
+        order = (range(top, bottom + 1) if n > 0 else
+                 range(bottom, top - 1, -1))
+        code, attr = self._bkgd
+        for y in order:
+            didx = self._offset + y * stride
+            if top <= y + n <= bottom:
+                sidx = didx + n * stride
+                self._chars[didx:didx + w] = self._chars[sidx:sidx + w]
+                self._attrs[didx:didx + w] = self._attrs[sidx:sidx + w]
+            else:
+                self._chars[didx:didx + w] = _array.array('L', (code,)) * w
+                self._attrs[didx:didx + w] = _array.array('L', (attr,)) * w
+    def refresh(self, *args):
+        "Do nothing; present for compatibility"
+    def noutrefresh(self, *args):
+        "Do nothing; present for compatibility"
+    def keypad(self, flag):
+        "Do nothing; present for compatibility"
+    def nodelay(self, flag):
+        "Set whether getch() blocks"
+        self._nodelay = bool(flag)
+    def getch(self):
+        """
+        Return the next keystroke queued via HeadlessBackend.feed()
+
+        Returns -1 if there is none; since nothing could ever arrive, this
+        raises a curses.error instead of blocking forever in blocking mode.
+        """
+        if self.backend.input:
+            return self.backend.input.popleft()
+        elif self._nodelay:
+            return -1
+        else:
+            raise _curses.error('no input')
+    def dump(self, attrs=False):
+        """
+        Return the contents of this window as a list of strings
+
+        Alternate character set glyphs are shown as their ASCII
+        approximations. If attrs is true, a list of lists of the attributes
+        of each cell is returned along with the text as a 2-tuple.
+        """
+        lines, lattrs = [], []
+        for y in range(self._height):
+            base = self._offset + y * self._stride
+            lines.append(''.join(_unichr(c) for c in
+                                 self._chars[base:base + self._width]))
+            lattrs.append(list(self._attrs[base:base + self._width]))
+        return (lines, lattrs) if attrs else lines
+
+class HeadlessBackend(object):
+    """
+    A screen backend drawing into memory instead of a terminal
+
+    This allows running widget hierarchies without a terminal (e.g. for
+    tests or benchmarks):
+    >>> backend = HeadlessBackend((80, 24))
+    >>> init(backend)
+    >>> root = WidgetRoot(backend.initscr())
+    >>> root.add(Label('Hello World'))
+    >>> root.update()
+    >>> backend.screen.dump()[0]
+
+    Attributes are:
+    size          : The (width, height) of the emulated screen.
+    screen        : The HeadlessWindow representing the screen (created by
+                    initscr()), or None.
+    input         : A deque of keystrokes to be returned by getch().
+    colors        : A mapping from color pair numbers to (fg, bg) tuples.
+    cursor        : The cursor position (as a (y, x) tuple) set by the last
+                    setsyx() call, or None.
+    cursor_visible: The last cursor visibility set by curs_set().
+    updates       : The amount of doupdate() calls performed.
+    """
+    ACS_BLOCK     = ord('#') | _curses.A_ALTCHARSET
+    ACS_BTEE      = ord('+') | _curses.A_ALTCHARSET
+    ACS_BULLET    = ord('o') | _curses.A_ALTCHARSET
+    ACS_DARROW    = ord('v') | _curses.A_ALTCHARSET
+    ACS_HLINE     = ord('-') | _curses.A_ALTCHARSET
+    ACS_LARROW    = ord('<') | _curses.A_ALTCHARSET
+    ACS_LLCORNER  = ord('+') | _curses.A_ALTCHARSET
+    ACS_LRCORNER  = ord('+') | _curses.A_ALTCHARSET
+    ACS_LTEE      = ord('+') | _curses.A_ALTCHARSET
+    ACS_RARROW    = ord('>') | _curses.A_ALTCHARSET
+    ACS_RTEE      = ord('+') | _curses.A_ALTCHARSET
+    ACS_SSSS      = ord('+') | _curses.A_ALTCHARSET
+    ACS_TTEE      = ord('+') | _curses.A_ALTCHARSET
+    ACS_UARROW    = ord('^') | _curses.A_ALTCHARSET
+    ACS_ULCORNER  = ord('+') | _curses.A_ALTCHARSET
+    ACS_URCORNER  = ord('+') | _curses.A_ALTCHARSET
+    ACS_VLINE     = ord('|') | _curses.A_ALTCHARSET
+    def __init__(self, size=(80, 24)):
+        """
+        Initializer
+
+        size is the (width, height) of the emulated screen.
+        """
+        self.size = size
+        self.screen = None
+        self.input = _collections.deque()
+        self.colors = {}
+        self.cursor = None
+        self.cursor_visible = 1
+        self.updates = 0
+    def initscr(self):
+        "Create (or re-create) the screen window and return it"
+        self.screen = HeadlessWindow(self, self.size[1], self.size[0])
+        return self.screen
+    def newwin(self, nlines, ncols, begin_y=0, begin_x=0):
+        "Create a new window"
+        return HeadlessWindow(self, nlines, ncols)
+    def newpad(self, nlines, ncols):
+        "Create a new pad"
+        return HeadlessWindow(self, nlines, ncols)
+    def feed(self, *keys):
+        "Queue keystrokes (integers or single-character strings) for input"
+        for k in keys:
+            self.input.append(ord(k) if isinstance(k, _unicode) else k)
+    def color_pair(self, n):
+        "Return the attribute value of the color pair n"
+        return (n << 8) & _curses.A_COLOR
+    def pair_number(self, attr):
+        "Return the color pair number of the attribute value attr"
+        return (attr & _curses.A_COLOR) >> 8
+    def init_pair(self, n, fg, bg):
+        "Define the color pair n"
+        self.colors[n] = (fg, bg)
+    def has_colors(self):
+        "Return whether colors are supported"
+        return True
+    def curs_set(self, visibility):
+        "Set the cursor visibility and return the previous one"
+        ret, self.cursor_visible = self.cursor_visible, visibility
+        return ret
+    def setsyx(self, y, x):
+        "Set the position of the cursor"
+        self.cursor = None if (y, x) == (-1, -1) else (y, x)
+    def doupdate(self):
+        "Count the update; there is no physical screen to update"
+        self.updates += 1
+    def getmouse(self):
+        "Fail, as no mouse events can ever be pending"
+        raise _curses.error('getmouse() returned ERR')
+
+class ClipWindow(object):
+    """
+    A proxy for a curses window that translates and clips drawing
+
+    Widgets draw at absolute coordinates into the window they are given;
+    a ClipWindow allows them to do so when only a part of that coordinate
+    space is backed by an actual window (such as the visible part of the
+    content of a Viewport). Drawing outside that part is discarded, and
+    containers skip children that lie entirely outside of it.
+
+    Only the subset of the curses window interface used by widgets for
+    drawing is implemented; the (y, x) position arguments are mandatory,
+    and text is not wrapped at the right edge.
+
+    Attributes are:
+    window  : The underlying window, or None if no area is backed.
+    cliprect: The backed area as a rectangle in the coordinates of the
+              proxy.
+    size    : The nominal size of the proxy as a (width, height) tuple.
+    origin  : The position (in the coordinates of the proxy) the top-left
+              corner of window is mapped to. Defaults to that of cliprect;
+              others allow clipping drawing to a part of window without
+              creating a subwindow.
+    """
+    def __init__(self, window, cliprect, size, origin=None):
+        "Initializer"
+        self.window = window
+        self.cliprect = cliprect
+        self.size = size
+        self.origin = (tuple(cliprect[:2]) if origin is None else
+                       tuple(origin))
+    def _hspan(self, y, x, n):
+        "Return the visible part of a horizontal span as (x, n), or None"
+        cx, cy, cw, ch = self.cliprect
+        if self.window is None or not cy <= y < cy + ch: return None
+        sx, ex = max(x, cx), min(x + n, cx + cw)
+        if sx >= ex: return None
+        return (sx, ex - sx)
+    def _vspan(self, y, x, n):
+        "Return the visible part of a vertical span as (y, n), or None"
+        cx, cy, cw, ch = self.cliprect
+        if self.window is None or not cx <= x < cx + cw: return None
+        sy, ey = max(y, cy), min(y + n, cy + ch)
+        if sy >= ey: return None
+        return (sy, ey - sy)
+    def _write(self, func, y, x, n, *args):
+        "Perform a write of n cells at (y, x) via the given window method"
+        ox, oy = self.origin
+        try:
+            func(y - oy, x - ox, *args)
+        except _curses.error:
+            # Writing into the last cell of a window "fails" after the
+            # fact; as clipping can make any cell the last one, this is
+            # tolerated.
+            my, mx = self.window.getmaxyx()
+            if (y - oy, x - ox + n) != (my - 1, mx): raise
+    def getmaxyx(self):
+        "Return the nominal size of this window as a (height, width) tuple"
+        return (self.size[1], self.size[0])
+    def derwin(self, *args):
+        """
+        Create a clipped subwindow
+
+        Accepts (begin_y, begin_x) or (nlines, ncols, begin_y, begin_x); the
+        result is a ClipWindow whose coordinates are relative to its own
+        top-left corner, as with curses.
+        """
+        if len(args) == 2:
+            nlines, ncols, by, bx = 0, 0, args[0], args[1]
+        else:
+            nlines, ncols, by, bx = args
+        if nlines == 0: nlines = self.size[1] - by
+        if ncols == 0: ncols = self.size[0] - bx
+        vx, vy, vw, vh = intersectrect((bx, by, ncols, nlines),
+                                       self.cliprect)
+        if self.window is None or vw <= 0 or vh <= 0:
+            return ClipWindow(None, (0, 0, 0, 0), (ncols, nlines))
+        ox, oy = self.origin
+        sub = self.window.derwin(vh, vw, vy - oy, vx - ox)
+        return ClipWindow(sub, (vx - bx, vy - by, vw, vh), (ncols, nlines))
+    def _covers_window(self):
+        "Return whether the backed area is all of the underlying window"
+        cx, cy, cw, ch = self.cliprect
+        return ((cx, cy) == self.origin and
+                tuple(self.window.getmaxyx()) == (ch, cw))
+    def bkgd(self, ch, attr=0):
+        "Set the background of the underlying window"
+        if self.window is not None: self.window.bkgd(ch, attr)
+    def clear(self):
+        "Clear the backed area"
+        if self.window is None: return
+        if self._covers_window():
+            self.window.clear()
+        else:
+            self.erase()
+    def erase(self):
+        "Erase the backed area"
+        if self.window is None: return
+        if self._covers_window():
+            self.window.erase()
+            return
+        cx, cy, cw, ch = self.cliprect
+        for y in range(cy, cy + ch):
+            self.hline(y, cx, ' ', cw)
+    def addch(self, y, x, ch, *attr):
+        "Draw a character"
+        if self._hspan(y, x, 1) is None: return
+        self._write(self.window.addch, y, x, 1, ch, *attr)
+    def insch(self, y, x, ch, *attr):
+        "Insert a character"
+        if self._hspan(y, x, 1) is None: return
+        ox, oy = self.origin
+        self.window.insch(y - oy, x - ox, ch, *attr)
+    def addstr(self, y, x, text, *attr):
+        "Draw a string"
+        if isinstance(text, bytes):
+            s = text.decode(_ENCODING or 'latin-1')
+        else:
+            s = text
+        span = self._hspan(y, x, len(s))
+        if span is None: return
+        sx, n = span
+        s = s[sx - x:sx - x + n]
+        if isinstance(text, bytes): s = s.encode(_ENCODING or 'latin-1')
+        self._write(self.window.addstr, y, sx, n, s, *attr)
+    def hline(self, y, x, ch, n, *attr):
+        "Draw a horizontal line"
+        span = self._hspan(y, x, n)
+        if span is None: return
+        ox, oy = self.origin
+        self.window.hline(y - oy, span[0] - ox, ch, span[1], *attr)
+    def vline(self, y, x, ch, n, *attr):
+        "Draw a vertical line"
+        span = self._vspan(y, x, n)
+        if span is None: return
+        ox, oy = self.origin
+        self.window.vline(span[0] - oy, x - ox, ch, span[1], *attr)
+    def border(self, *chars):
+        "Draw a border along the nominal edges of this window"
+        b = _BACKEND
+        defaults = (b.ACS_VLINE, b.ACS_VLINE, b.ACS_HLINE, b.ACS_HLINE,
+                    b.ACS_ULCORNER, b.ACS_URCORNER, b.ACS_LLCORNER,
+                    b.ACS_LRCORNER)
+        chars += (0,) * (8 - len(chars))
+        ls, rs, ts, bs, tl, tr, bl, br = [c or d for c, d in
+                                          zip(chars, defaults)]
+        w, h = self.size
+        self.vline(0, 0, ls, h)
+        self.vline(0, w - 1, rs, h)
+        self.hline(0, 0, ts, w)
+        self.hline(h - 1, 0, bs, w)
+        self.addch(0, 0, tl)
+        self.addch(0, w - 1, tr)
+        self.addch(h - 1, 0, bl)
+        self.addch(h - 1, w - 1, br)
+    def blit(self, src, sminrow, smincol, dminrow, dmincol, dmaxrow,
+             dmaxcol):
+        """
+        Copy a region of the window src into this one
+
+        The arguments are the same as those of curses' overwrite() (with the
+        destination coordinates in terms of this window); see also
+        overwrite_window().
+        """
+        cx, cy, cw, ch = self.cliprect
+        if self.window is None: return
+        sy, sx = max(dminrow, cy), max(dmincol, cx)
+        ey, ex = min(dmaxrow, cy + ch - 1), min(dmaxcol, cx + cw - 1)
+        if sy > ey or sx > ex: return
+        ox, oy = self.origin
+        overwrite_window(src, self.window, sminrow + sy - dminrow,
+                         smincol + sx - dmincol, sy - oy, sx - ox, ey - oy,
+                         ex - ox)
+
+def overwrite_window(src, dest, sminrow, smincol, dminrow, dmincol, dmaxrow,
+                     dmaxcol):
+    """
+    Copy a region of the window src into dest, which may be a ClipWindow
+
+    The arguments are as for curses' overwrite() method.
+    """
+    if isinstance(dest, ClipWindow):
+        dest.blit(src, sminrow, smincol, dminrow, dmincol, dmaxrow, dmaxcol)
+    elif (isinstance(dest, HeadlessWindow) and
+            not isinstance(src, HeadlessWindow)):
+        # A curses pad (e.g. of a Canvas) is drawn into a frame buffer (see
+        # WidgetRoot); curses cannot copy between the two, so do it cell by
+        # cell.
+        for y in range(dmaxrow - dminrow + 1):
+            for x in range(dmaxcol - dmincol + 1):
+                ch = src.inch(sminrow + y, smincol + x)
+                idx = dest._index(dminrow + y, dmincol + x)
+                dest._chars[idx] = ch & _curses.A_CHARTEXT
+                dest._attrs[idx] = ch & ~_curses.A_CHARTEXT
+    else:
+        src.overwrite(dest, sminrow, smincol, dminrow, dmincol, dmaxrow,
+                      dmaxcol)
+
+def clip_window(win, rect):
+    """
+    Return a ClipWindow restricting drawing into win to rect
+
+    win may be a ClipWindow itself, in which case the result is clipped to
+    both. No curses objects are created.
+    """
+    if isinstance(win, ClipWindow):
+        return ClipWindow(win.window, intersectrect(rect, win.cliprect),
+                          win.size, win.origin)
+    h, w = win.getmaxyx()
+    return ClipWindow(win, intersectrect(rect, (0, 0, w, h)), (w, h),
+                      (0, 0))
+
+def new_pad(win, nlines, ncols):
+    """
+    Create a pad that can be copied into win, which may be a ClipWindow
+
+    If win is backed by an in-memory window (such as the frame buffer of a
+    WidgetRoot), so is the pad; otherwise, it is a curses pad.
+    """
+    while isinstance(win, ClipWindow) and win.window is not None:
+        win = win.window
+    if isinstance(win, HeadlessWindow):
+        return HeadlessWindow(win.backend, nlines, ncols)
+    return _BACKEND.newpad(nlines, ncols)
+
+def scroll_window(win, rect, n):
+    """
+    Shift the contents of the given region of win up by n lines
+
+    A negative n shifts downwards; what is scrolled in is blank. win may be
+    a ClipWindow, in which case rect must lie within the backed area.
+    Returns whether the contents could be shifted; if not, the caller
+    should redraw the region instead.
+    """
+    x, y, w, h = rect
+    if isinstance(win, ClipWindow):
+        cx, cy, cw, ch = win.cliprect
+        if (win.window is None or x < cx or y < cy or x + w > cx + cw or
+                y + h > cy + ch):
+            return False
+        ox, oy = win.origin
+        return scroll_window(win.window, (x - ox, y - oy, w, h), n)
+    if n == 0: return True
+    my, mx = win.getmaxyx()
+    if x == 0 and w == mx:
+        # Whole rows are shifted by curses itself within a scrolling
+        # region, which is reset afterwards.
+        try:
+            win.setscrreg(y, y + h - 1)
+            win.scrollok(True)
+            win.scroll(n)
+        except _curses.error:
+            return False
+        finally:
+            win.scrollok(False)
+            win.setscrreg(0, my - 1)
+        return True
+    # Otherwise, the rows that stay visible are copied out to a scratch pad
+    # (which is kept across calls) and back to their new place, instead of
+    # scrolling a subwindow created for every call.
+    k = min(abs(n), h)
+    try:
+        if k < h:
+            pad = _scratch_pad(win, h - k, w)
+            sy, dy = (y + k, y) if n > 0 else (y, y + k)
+            win.overwrite(pad, sy, x, 0, 0, h - k - 1, w - 1)
+            pad.overwrite(win, 0, 0, dy, x, dy + h - k - 1, x + w - 1)
+        for r in (range(y + h - k, y + h) if n > 0 else range(y, y + k)):
+            win.hline(r, x, ' ', w)
+    except _curses.error:
+        return False
+    return True
+
+def _scratch_pad(win, nlines, ncols):
+    "Internal helper"
+    global _SCRATCH
+    pad = _SCRATCH
+    if (pad is None or isinstance(pad, HeadlessWindow) !=
+            isinstance(win, HeadlessWindow)):
+        pad = new_pad(win, nlines, ncols)
+    else:
+        h, w = pad.getmaxyx()
+        if h < nlines or w < ncols:
+            pad = new_pad(win, max(h, nlines), max(w, ncols))
+    _SCRATCH = pad
+    return pad
+
+def _addstr(win, y, x, s, attr):
+    "Internal drawing helper"
+    # Encodes s as appropriate, and tolerates writing into the last cell of
+    # win, which "fails" after the fact.
+    if not s: return
+    try:
+        win.addstr(y, x, s if _ENCODING is None else s.encode(_ENCODING),
+                   attr)
+    except _curses.error:
+        my, mx = win.getmaxyx()
+        if (y, x + len(s)) != (my - 1, mx): raise
+
+def fill_rect(win, rect, ch=' ', attr=0):
+    """
+    Fill the given rectangle of win with ch in the attribute attr
+
+    win may be a ClipWindow; rect is clipped to its bounds. Unlike setting
+    the background of a subwindow and clearing that, this does not create
+    any curses objects. As with bkgd(), a NUL ch stands for a blank.
+    """
+    x, y, w, h = rect
+    my, mx = win.getmaxyx()
+    if x < 0 or y < 0 or x + w > mx or y + h > my:
+        x, y, w, h = intersectrect(rect, (0, 0, mx, my))
+    if w <= 0 or h <= 0: return
+    # hline() would replace a NUL by a line drawing character.
+    if ch in ('\0', b'\0', 0): ch = ' '
+    for row in range(y, y + h):
+        win.hline(row, x, ch, w, attr)
+
+def draw_line(win, pos, length, vert, ch, attr=0):
+    """
+    Draw a straight line of ch into win
+
+    The line starts at pos and extends length cells to the right, or
+    downwards if vert is true; it is clipped to the bounds of win (which
+    may be a ClipWindow).
+    """
+    x, y = pos
+    w, h = (1, length) if vert else (length, 1)
+    my, mx = win.getmaxyx()
+    if x < 0 or y < 0 or x + w > mx or y + h > my:
+        x, y, w, h = intersectrect((x, y, w, h), (0, 0, mx, my))
+    if w <= 0 or h <= 0: return
+    if vert:
+        win.vline(y, x, ch, h, attr)
+    else:
+        win.hline(y, x, ch, w, attr)
+
+def draw_char(win, pos, ch, attr=0):
+    """
+    Draw a single character into win at pos unless that is out of bounds
+
+    win may be a ClipWindow. Unlike addch(), this does not fail in the
+    bottom-right corner of win.
+    """
+    my, mx = win.getmaxyx()
+    x, y = pos
+    if not (0 <= x < mx and 0 <= y < my): return
+    try:
+        win.addch(y, x, ch, attr)
+    except _curses.error:
+        if (y, x) != (my - 1, mx - 1): raise
+
+_BACKEND = CursesBackend()
+
 class Styler(object):
     """
     A class responsible for managing "styles" of widgets
@@ -593,12 +1558,12 @@ class Styler(object):
         if isinstance(fg, str): fg = self.COLOR_NAMES[fg]
         if isinstance(bg, str): bg = self.COLOR_NAMES[bg]
         if (fg, bg) in self.colors:
-            return _curses.color_pair(self.colors[fg, bg]) | attr
+            return _BACKEND.color_pair(self.colors[fg, bg]) | attr
         elif self.do_colors:
             cpi = len(self.colors) + 1
-            _curses.init_pair(cpi, fg, bg)
+            _BACKEND.init_pair(cpi, fg, bg)
             self.colors[fg, bg] = cpi
-            return _curses.color_pair(cpi) | attr
+            return _BACKEND.color_pair(cpi) | attr
         elif self.parent is not None:
             return self.parent.getcolor(fg, bg, attr)
         else:
@@ -698,6 +1663,571 @@ class InstanceStyler(Styler):
         widget.styler = self
         return widget
 
+class Profiler(object):
+    """
+    Opt-in instrumentation counting and timing widget method calls
+
+    While enabled, the methods named in METHODS of Widget, WidgetRoot, and
+    all their subclasses are wrapped to record the amount of calls and the
+    time spent in them, per class and per widget instance. When disabled,
+    the original methods are restored, so that there is no overhead at all.
+    Classes defined after enable() was called are not instrumented.
+
+    Times are inclusive (i.e. they contain the time spent in nested calls
+    of other instrumented methods); calls of a method invoked by the same
+    method on the same object (like Container.make() invoking Widget.make())
+    are only counted once.
+
+    A WidgetRoot whose profiler attribute is set to a Profiler marks the
+    end of every frame on it, so that the statistics of the last frame are
+    available as well as cumulative ones.
+
+    Typical usage:
+    >>> prof = Profiler()
+    >>> root.profiler = prof.enable()
+    >>> ... # Interact with the UI
+    >>> print(prof.report(frame=True))
+
+    Attributes are:
+    frames    : The amount of frames ended via end_frame().
+    last_frame: The per-class statistics of the last frame (as returned by
+                summary()).
+    """
+    METHODS = ('getminsize', 'getprefsize', 'make', 'relayout', 'draw_self',
+               'invalidate', 'invalidate_layout')
+    _enabled = None
+    def __init__(self):
+        """
+        Initializer
+        """
+        self.frames = 0
+        self.last_frame = {}
+        self._classes = {}
+        self._frame = {}
+        self._instances = _weakref.WeakKeyDictionary()
+        self._active = set()
+        self._patched = []
+    def __enter__(self):
+        return self.enable()
+    def __exit__(self, *args):
+        self.disable()
+    def _record(self, obj, name, duration):
+        "Account for a call of method name on obj taking duration seconds"
+        cls = obj.__class__
+        for table in (self._classes, self._frame):
+            entry = table.setdefault(cls, {}).setdefault(name, [0, 0.0])
+            entry[0] += 1
+            entry[1] += duration
+        try:
+            stats = self._instances.setdefault(obj, {})
+        except TypeError:
+            return
+        entry = stats.setdefault(name, [0, 0.0])
+        entry[0] += 1
+        entry[1] += duration
+    def _wrap(self, name, func):
+        "Return an instrumented version of the method func"
+        active, record = self._active, self._record
+        def wrapper(obj, *args, **kwds):
+            key = (id(obj), name)
+            if key in active:
+                return func(obj, *args, **kwds)
+            active.add(key)
+            start = _clock()
+            try:
+                return func(obj, *args, **kwds)
+            finally:
+                active.discard(key)
+                record(obj, name, _clock() - start)
+        wrapper.__name__ = func.__name__
+        wrapper.__doc__ = func.__doc__
+        return wrapper
+    def enable(self):
+        """
+        Start instrumenting and return self
+
+        Only one Profiler can be enabled at a time.
+        """
+        if Profiler._enabled is self: return self
+        if Profiler._enabled is not None:
+            raise RuntimeError('Another profiler is already enabled')
+        classes, todo = [], [WidgetRoot, Widget]
+        while todo:
+            cls = todo.pop()
+            if cls in classes: continue
+            classes.append(cls)
+            todo.extend(cls.__subclasses__())
+        for cls in classes:
+            for name in self.METHODS:
+                func = cls.__dict__.get(name)
+                if func is None: continue
+                self._patched.append((cls, name, func))
+                setattr(cls, name, self._wrap(name, func))
+        Profiler._enabled = self
+        return self
+    def disable(self):
+        "Stop instrumenting and restore the original methods"
+        if Profiler._enabled is not self: return
+        for cls, name, func in reversed(self._patched):
+            setattr(cls, name, func)
+        self._patched = []
+        self._active.clear()
+        Profiler._enabled = None
+    def end_frame(self):
+        """
+        Finish the current frame
+
+        The statistics gathered since the previous call become last_frame.
+        """
+        self.frames += 1
+        self.last_frame = self.summary(self._frame)
+        self._frame = {}
+    def reset(self):
+        "Discard all statistics gathered so far"
+        self.frames = 0
+        self.last_frame = {}
+        self._classes = {}
+        self._frame = {}
+        self._instances = _weakref.WeakKeyDictionary()
+    def summary(self, table=None):
+        """
+        Return the cumulative per-class statistics
+
+        The result is a mapping from class names to mappings from method
+        names to (calls, seconds) tuples. table is for internal use.
+        """
+        if table is None: table = self._classes
+        ret = {}
+        for cls, stats in table.items():
+            dest = ret.setdefault(cls.__name__, {})
+            for name, (count, duration) in stats.items():
+                oc, od = dest.get(name, (0, 0.0))
+                dest[name] = (oc + count, od + duration)
+        return ret
+    def instance_stats(self, widget):
+        """
+        Return the statistics of the given widget
+
+        The result is a mapping from method names to (calls, seconds)
+        tuples.
+        """
+        stats = self._instances.get(widget, {})
+        return dict((k, tuple(v)) for k, v in stats.items())
+    def top_instances(self, method, limit=10):
+        """
+        Return the widgets which spent the most time in the given method
+
+        The result is a list of (widget, calls, seconds) tuples.
+        """
+        ret = []
+        for widget, stats in list(self._instances.items()):
+            if method in stats:
+                ret.append((widget, stats[method][0], stats[method][1]))
+        ret.sort(key=lambda e: -e[2])
+        return ret[:limit]
+    def report(self, frame=False):
+        """
+        Format the statistics as a human-readable table
+
+        If frame is true, the statistics of the last frame are reported;
+        otherwise, the cumulative ones.
+        """
+        stats = self.last_frame if frame else self.summary()
+        rows = []
+        for cls, methods in stats.items():
+            for name, (count, duration) in methods.items():
+                rows.append((duration, cls, name, count))
+        rows.sort(key=lambda r: (-r[0], r[1], r[2]))
+        lines = ['%-20s %-18s %8s %12s %10s' % ('class', 'method', 'calls',
+                                               'total ms', 'mean us')]
+        for duration, cls, name, count in rows:
+            lines.append('%-20s %-18s %8d %12.3f %10.2f' % (cls, name, count,
+                duration * 1e3, duration * 1e6 / count))
+        return '\n'.join(lines)
+
+class DataSource(object):
+    """
+    A lazily accessed sequence of items for virtual widgets
+
+    Data sources decouple widgets displaying large amounts of data (such as
+    DataGrid) from the storage of the data: a widget fetches only the items
+    it is about to display, and is notified by the source when items
+    change. Subclasses override __len__() and fetch(); the base class
+    manages the watchers, and, by itself, presents no items at all.
+
+    Notifications may originate from other threads (in particular, from
+    sources building an index in the background); set dispatch to, e.g.,
+    the call_soon_threadsafe() method of a WidgetRoot to have them delivered
+    in the thread running the main loop.
+
+    Attributes are:
+    dispatch: A callable invoked as dispatch(callback, start, end) to
+              deliver a notification, or None (the default) to invoke the
+              callbacks immediately.
+    """
+    def __init__(self, dispatch=None):
+        "Initializer"
+        self.dispatch = dispatch
+        self._watchers = []
+    def __len__(self):
+        """
+        Return the current amount of items
+
+        The default implementation returns zero.
+        """
+        return 0
+    def __getitem__(self, index):
+        "Return the index-th item"
+        if index < 0: index += len(self)
+        ret = self.fetch(index, index + 1) if index >= 0 else []
+        if not ret: raise IndexError('DataSource index out of range')
+        return ret[0]
+    def fetch(self, start, end):
+        """
+        Return a list of the items from index start to (exclusively) end
+
+        The range is clamped to the items available. The default
+        implementation returns an empty list.
+        """
+        return []
+    def watch(self, callback):
+        """
+        Invoke callback whenever items of the source change
+
+        callback is called with two arguments, start and end, which delimit
+        the range of indices of the items that changed; end is None if all
+        items from start on may have changed, which includes changes of the
+        amount of items.
+        """
+        if callback not in self._watchers: self._watchers.append(callback)
+    def unwatch(self, callback):
+        """
+        Stop invoking callback on changes
+
+        Unknown callbacks are silently ignored.
+        """
+        try:
+            self._watchers.remove(callback)
+        except ValueError:
+            pass
+    def notify(self, start=0, end=None):
+        """
+        Notify the watchers about a change of the items from start to end
+
+        This should be called (by subclasses or by the owner of the
+        underlying data) whenever the data change; see watch() for the
+        arguments.
+        """
+        for callback in list(self._watchers):
+            if self.dispatch is None:
+                callback(start, end)
+            else:
+                self.dispatch(callback, start, end)
+
+class SequenceSource(DataSource):
+    """
+    A data source presenting a Python sequence
+
+    The sequence must support len() and slicing; call notify() after
+    modifying it.
+
+    Attributes are:
+    sequence: The sequence presented.
+    """
+    def __init__(self, sequence, **kwds):
+        "Initializer"
+        DataSource.__init__(self, kwds.get('dispatch'))
+        self.sequence = sequence
+    def __len__(self):
+        "Return the current amount of items"
+        return len(self.sequence)
+    def fetch(self, start, end):
+        "Return a list of the items from index start to (exclusively) end"
+        return list(self.sequence[max(start, 0):max(end, 0)])
+
+class IteratorSource(DataSource):
+    """
+    A data source pulling items from an iterator as they are accessed
+
+    Only the items accessed so far (plus a margin of prefetch ones) are
+    pulled from the iterator; when items close to the end are fetched,
+    further ones are pulled (and the watchers notified), so that the
+    source grows as it is scrolled through. If capacity is not None, at
+    most that many items are retained; once that many have been pulled,
+    fetching does not pull any further ones. Calling pull() lets new items
+    in nonetheless, discarding the oldest ones; the indices of the others
+    shift accordingly.
+
+    Attributes are:
+    capacity : The maximum amount of items retained, or None for no limit
+               (the default). Read-only.
+    prefetch : How many items beyond the last one fetched to pull from the
+               iterator. Defaults to 100.
+    exhausted: Whether the iterator has been exhausted. Read-only.
+    """
+    def __init__(self, iterable, capacity=None, **kwds):
+        "Initializer"
+        DataSource.__init__(self, kwds.get('dispatch'))
+        self.capacity = capacity
+        self.prefetch = kwds.get('prefetch', 100)
+        self.exhausted = False
+        self._iter = iter(iterable)
+        if capacity is None:
+            self._items = []
+        else:
+            self._items = _collections.deque(maxlen=capacity)
+        self._pull(self.prefetch)
+    def __len__(self):
+        "Return the current amount of items"
+        return len(self._items)
+    def _pull(self, amount):
+        "Internal helper"
+        items, count = self._items, 0
+        for item in _itertools.islice(self._iter, amount):
+            items.append(item)
+            count += 1
+        if count < amount: self.exhausted = True
+        return count
+    def pull(self, amount):
+        """
+        Pull up to amount further items from the iterator
+
+        Returns the amount of items actually pulled, and notifies the
+        watchers if that is nonzero.
+        """
+        old = len(self._items)
+        count = self._pull(amount)
+        if count:
+            # If items have been discarded, all indices have shifted.
+            self.notify(0 if old + count > len(self._items) else old, None)
+        return count
+    def fetch(self, start, end):
+        "Return a list of the items from index start to (exclusively) end"
+        start, end = max(start, 0), max(end, 0)
+        items = self._items
+        if isinstance(items, list):
+            ret = items[start:end]
+        else:
+            ret = list(_itertools.islice(items, start, end))
+        # Fetching never discards items, as the indices would shift
+        # underneath the caller (and a view close to the end would keep
+        # shifting them); only the items beyond the requested ones change.
+        need = end + self.prefetch - len(items)
+        if self.capacity is not None:
+            need = min(need, self.capacity - len(items))
+        if need > 0 and not self.exhausted: self.pull(need)
+        return ret
+
+class MappedFileSource(DataSource):
+    """
+    A data source presenting the lines of a memory-mapped text file
+
+    The file is mapped into memory instead of being read, and lines are
+    located using a sparse index recording the offset of every stride-th
+    line, so that the memory needed does not depend on the size of the
+    file. The index is built incrementally, either in a background thread
+    or by explicit calls to scan() (for example, in idle time or when the
+    user scrolls close to the end of what has been indexed so far). Only
+    the lines actually fetched are decoded.
+
+    The amount of items is that of the lines indexed so far (a final line
+    without a terminating newline is included once the whole file has been
+    indexed); the watchers are notified as it grows. If the file has been
+    appended to, poll() picks up the new content without reading the rest
+    of the file again (similarly to "tail -f").
+
+    Attributes are:
+    path      : The path of the file. Read-only.
+    encoding  : The encoding to decode lines with. None (the default) means
+                the one chosen by init(), or UTF-8 if init() has not been
+                called. Undecodable bytes are replaced.
+    stride    : The amount of lines between two index entries. Defaults to
+                256. Read-only.
+    chunk     : The amount of bytes scan() indexes by default. Defaults to
+                1 MiB.
+    background: Whether to build the index in a background thread. If
+                true (the default), the thread is started immediately and
+                whenever poll() detects new content. Read-only.
+    """
+    def __init__(self, path, encoding=None, **kwds):
+        "Initializer"
+        DataSource.__init__(self, kwds.get('dispatch'))
+        self.path = path
+        self.encoding = encoding
+        self.stride = kwds.get('stride', 256)
+        self.chunk = kwds.get('chunk', 1048576)
+        self.background = kwds.get('background', True)
+        self._lock = _threading.RLock()
+        self._thread = None
+        self._closed = False
+        self._file = open(path, 'rb')
+        self._map = None
+        self._size = 0
+        self._reset()
+        self._remap()
+        if self.background: self._start()
+    def _reset(self):
+        "Internal helper"
+        # _marks[k] is the offset of the (k * stride)-th line; _count is the
+        # amount of newlines before _scanpos, the last of which ends just
+        # before _linestart.
+        self._marks = [0]
+        self._count = 0
+        self._linestart = 0
+        self._scanpos = 0
+    def _remap(self):
+        "Internal helper"
+        size = _os.fstat(self._file.fileno()).st_size
+        if self._map is not None: self._map.close()
+        if size:
+            self._map = _mmap.mmap(self._file.fileno(), size,
+                                   access=_mmap.ACCESS_READ)
+        else:
+            self._map = None
+        self._size = size
+    def indexed(self):
+        "Return whether the whole file has been indexed"
+        with self._lock:
+            return self._scanpos >= self._size
+    def _len(self):
+        "Internal helper"
+        if self._scanpos >= self._size and self._linestart < self._size:
+            return self._count + 1
+        return self._count
+    def __len__(self):
+        "Return the amount of lines indexed so far"
+        with self._lock:
+            return self._len()
+    def _sync(self, grow=True):
+        "Internal helper"
+        # Picks up a change of the size of the file (only a shrinking one
+        # unless grow is true), returning the index of the first line
+        # affected, or None. Accessing the mapping beyond the end of a
+        # truncated file would crash the process (with SIGBUS), so this is
+        # checked before every access.
+        if self._closed: return None
+        oldsize = self._size
+        size = _os.fstat(self._file.fileno()).st_size
+        if size == oldsize or size > oldsize and not grow: return None
+        old = self._len()
+        self._remap()
+        if self._size < oldsize:
+            self._reset()
+            return 0
+        return max(old - 1, 0)
+    def _start(self):
+        "Internal helper"
+        with self._lock:
+            if self._thread is not None or self._closed: return
+            self._thread = _threading.Thread(target=self._run)
+            self._thread.daemon = True
+            self._thread.start()
+    def _run(self):
+        "Internal helper"
+        while True:
+            with self._lock:
+                if self._closed or self._scanpos >= self._size:
+                    self._thread = None
+                    return
+            self.scan()
+    def scan(self, amount=None):
+        """
+        Extend the index over up to amount further bytes of the file
+
+        amount defaults to the chunk attribute. Returns whether there is
+        still content that has not been indexed.
+        """
+        if amount is None: amount = self.chunk
+        with self._lock:
+            if self._closed: return False
+            start = self._sync(False)
+            old = self._len()
+            if self._scanpos < self._size:
+                self._scan(min(self._scanpos + amount, self._size))
+            more = (self._scanpos < self._size)
+            if start is None and self._len() != old: start = max(old - 1, 0)
+        if start is not None: self.notify(start, None)
+        return more
+    def _scan(self, limit):
+        "Internal helper"
+        pos = self._scanpos
+        data = self._map[pos:limit]
+        n = data.count(b'\n')
+        if n:
+            # Only the newlines after which index entries are due need to be
+            # located individually.
+            stride, find = self.stride, data.find
+            need = stride - self._count % stride
+            i, k = -1, 0
+            while need <= n:
+                while k < need:
+                    i = find(b'\n', i + 1)
+                    k += 1
+                self._marks.append(pos + i + 1)
+                need += stride
+            self._count += n
+            self._linestart = pos + data.rfind(b'\n') + 1
+        self._scanpos = limit
+    def poll(self):
+        """
+        Check whether the file has changed in size, and pick the change up
+
+        If the file has grown, only the new content is indexed (in the
+        background, if applicable); if it has shrunk (e.g. by being
+        truncated), the index is built anew. Returns whether the size
+        changed. This should be called periodically to follow a file that
+        is being written to.
+        """
+        with self._lock:
+            start = self._sync()
+        if start is None: return False
+        if self.background:
+            self._start()
+        self.notify(start, None)
+        return True
+    def fetch(self, start, end):
+        "Return a list of the lines from index start to (exclusively) end"
+        with self._lock:
+            shrunk = self._sync(False)
+            start, end = max(start, 0), min(end, self._len())
+            raw = []
+            if start < end: raw = self._fetch(start, end)
+        if shrunk is not None:
+            if self.background: self._start()
+            self.notify(0, None)
+        enc = self.encoding or _ENCODING or 'utf-8'
+        return [l[:-1].decode(enc, 'replace') if l.endswith(b'\r') else
+                l.decode(enc, 'replace') for l in raw]
+    def _fetch(self, start, end):
+        "Internal helper"
+        # Returns the raw lines from start to end, which must be indexed.
+        mm, size, find = self._map, self._size, self._map.find
+        k = start // self.stride
+        pos = self._marks[k]
+        for i in range(start - k * self.stride):
+            pos = find(b'\n', pos) + 1
+        ret = []
+        for i in range(end - start):
+            nl = find(b'\n', pos, size)
+            if nl == -1: nl = size
+            ret.append(mm[pos:nl])
+            pos = nl + 1
+        return ret
+    def close(self):
+        """
+        Stop indexing and release the file
+
+        The source must not be used afterwards.
+        """
+        with self._lock:
+            self._closed = True
+            thread = self._thread
+        if thread is not None: thread.join()
+        with self._lock:
+            if self._map is not None: self._map.close()
+            self._map = None
+            self._file.close()
+
 class WidgetRoot(object):
     """
     A container for a widget hierarchy directly interfacing curses
@@ -711,26 +2241,74 @@ class WidgetRoot(object):
     >>> root.add(widget)
     >>> root.main()
 
+    The widget hierarchy must only be accessed from the thread running the
+    main loop; other threads can use call_soon_threadsafe() to have code
+    run there.
+
     Attributes are:
     window       : The curses window to access.
     widget       : The (only) widget to host.
     styler       : A Styler instance to present to contained widgets.
     valid_display: Whether any part of self needs to be redrawn.
     valid_layout : Whether the layout of self needs to be remade.
+    damage       : The bounding rectangle of all areas invalidated since the
+                   last redraw, or None if there are none.
+    infd         : The file descriptor curses reads input from. None (the
+                   default) means that of standard input.
+    idle_timeout : The maximum time (in seconds) main() waits for input
+                   before checking for terminal resizes (which curses only
+                   reports when reading input). None means waiting
+                   indefinitely. Defaults to 0.25.
+    max_fps      : The maximum amount of frames (i.e. layout refreshes and
+                   redraws) per second the main loops perform. Any updates
+                   happening during the interval between two frames are
+                   rendered together in the next one. None (the default)
+                   means that there is no limit.
+    profiler     : A Profiler to notify about the end of every frame, or
+                   None (the default).
+    buffered     : Whether to draw into an in-memory frame buffer (a
+                   HeadlessWindow) instead of window, and to transfer only
+                   the cells that changed since the previous frame to
+                   window (grouped into runs of characters with equal
+                   attributes). This replaces the many fine-grained calls
+                   drawing entails by a few calls per frame, and a frame
+                   that changes nothing by none at all, which pays off if
+                   calls to window are expensive. As curses transmits only
+                   changed cells to the terminal anyway, and its drawing
+                   operations are faster than those of the buffer, this
+                   defaults to False.
     """
-    def __init__(self, window):
+    def __init__(self, window, infd=None):
         """
         Initializer
 
-        window is the curses window to draw to and to receive events from.
+        window is the curses window (or HeadlessWindow) to draw to and to
+        receive events from; infd is the file descriptor the input of window
+        arrives on.
         """
         self.window = window
         self.widget = None
         self.styler = None
         self.valid_display = False
         self.valid_layout = False
+        self.damage = None
+        self.infd = infd
+        self.idle_timeout = 0.25
+        self.max_fps = None
+        self.profiler = None
+        self.buffered = False
+        self._frame = None
+        self._shown = None
         self._grabbing = None
         self._cursorpos = None
+        self._watches = {}
+        self._running = False
+        self._update_hook = None
+        self._last_frame = None
+        self._calls = _collections.deque()
+        self._calls_lock = _threading.Lock()
+        self._calls_pending = False
+        self._wakeup = None
         self._init_decoder()
     def _init_decoder(self):
         "Initialize the input decoder"
@@ -766,16 +2344,93 @@ class WidgetRoot(object):
         Redraw the widget and adjust the cursor position as necessary
         """
         if self.widget is not None:
-            self.widget.draw(self.window)
+            if self.buffered:
+                frame = self._get_frame()
+                self.widget.draw(frame)
+                self._flush(frame)
+            else:
+                self._frame = self._shown = None
+                self.widget.draw(self.window)
             if self._cursorpos is None:
-                _curses.curs_set(0)
+                _BACKEND.curs_set(0)
                 self.window.refresh()
             else:
                 self.window.noutrefresh()
-                _curses.curs_set(1)
-                _curses.setsyx(self._cursorpos[1], self._cursorpos[0])
-                _curses.doupdate()
+                _BACKEND.curs_set(1)
+                _BACKEND.setsyx(self._cursorpos[1], self._cursorpos[0])
+                _BACKEND.doupdate()
         self.valid_display = True
+        self.damage = None
+    def _get_frame(self):
+        """
+        Return the frame buffer, (re-)creating it if necessary
+
+        A new frame buffer is blank, so the whole widget is invalidated.
+        """
+        hw = self.window.getmaxyx()
+        if self._frame is None or self._frame.getmaxyx() != hw:
+            self._frame = HeadlessWindow(_BACKEND, hw[0], hw[1])
+            self._shown = None
+            self.widget.invalidate(True)
+        return self._frame
+    def _flush(self, frame):
+        """
+        Transfer the cells of frame that changed since the last call to the
+        window
+
+        Only the rows spanned by the damage attribute are compared, as
+        nothing else can have been drawn.
+        """
+        chars, attrs = frame._chars, frame._attrs
+        h, w = frame.getmaxyx()
+        win, shown = self.window, self._shown
+        rows = range(h)
+        if shown is None:
+            self._shown = (_array.array('L', chars), _array.array('L', attrs))
+        elif self.damage is not None:
+            rows = range(max(self.damage[1], 0),
+                         min(self.damage[1] + self.damage[3], h))
+        for y in rows:
+            b, e = y * w, y * w + w
+            rc, ra = chars[b:e], attrs[b:e]
+            if shown is None:
+                start, end = 0, w
+            else:
+                sc, sa = shown[0][b:e], shown[1][b:e]
+                if rc == sc and ra == sa: continue
+                shown[0][b:e], shown[1][b:e] = rc, ra
+                # Locate the first and last changed cell by bisection, so
+                # that the cells are compared in bulk.
+                lo, hi = 0, w - 1
+                while lo < hi:
+                    m = (lo + hi) // 2
+                    if rc[:m + 1] == sc[:m + 1] and ra[:m + 1] == sa[:m + 1]:
+                        lo = m + 1
+                    else:
+                        hi = m
+                start, lo, hi = lo, lo, w - 1
+                while lo < hi:
+                    m = (lo + hi + 1) // 2
+                    if rc[m:] == sc[m:] and ra[m:] == sa[m:]:
+                        hi = m - 1
+                    else:
+                        lo = m
+                end = lo + 1
+            x = start
+            for attr, run in _itertools.groupby(ra[start:end]):
+                n = len(list(run))
+                if attr & _curses.A_ALTCHARSET:
+                    # Line drawing characters are reliably output only one
+                    # by one.
+                    for i in range(x, x + n):
+                        try:
+                            win.addch(y, i, rc[i] | attr)
+                        except _curses.error:
+                            if (y, i) != (h - 1, w - 1): raise
+                else:
+                    _addstr(win, y, x, ''.join(map(_unichr, rc[x:x + n])),
+                            attr)
+                x += n
     def grab_input(self, rect, pos=None, source=None, full=False):
         """
         Bring focus to the specified area
@@ -824,22 +2479,31 @@ class WidgetRoot(object):
         if not self.widget.focus(rev) and not self.widget.focus(rev):
             return False
         return True
-    def invalidate(self, rec=False, child=None):
+    def invalidate(self, rec=False, child=None, rect=None):
         """
         Mark the widget root as "damaged", i.e. in need of a redraw
 
         If rec is true, the entire widget tree is marked recursively
         regardless of topology and state (see Viewport for a notable
         exception), otherwise, subtrees are marked selectively. child
-        indicates which widget the redraw request originates from.
+        indicates which widget the redraw request originates from. rect is
+        the damaged area (None meaning the entire window); it is merged into
+        the damage attribute and, if rec is true, restricts the recursive
+        invalidation to the widgets overlapping it.
         """
+        if rect is None:
+            hw = self.window.getmaxyx()
+            rect = (0, 0, hw[1], hw[0])
+        self.damage = unionrect(self.damage, rect)
         if rec:
-            self.valid_display = False
-            self.widget.invalidate(rec)
+            ovd, self.valid_display = self.valid_display, False
+            self.widget.invalidate(rec, rect=rect)
+            if ovd: self.request_update()
             return
         if not self.valid_display: return
         self.valid_display = False
-        self.widget.invalidate()
+        if child is None: self.widget.invalidate()
+        self.request_update()
     def invalidate_layout(self):
         """
         Mark the widget root as in need of a layout refresh
@@ -850,6 +2514,24 @@ class WidgetRoot(object):
         if not self.valid_layout: return
         self.valid_layout = False
         self.widget.invalidate_layout()
+        self.request_update()
+    def invalidate_make(self, child=None):
+        """
+        Mark the widget root as in need of a make() of the nested widget
+
+        The nested widget keeps its size; see Widget.invalidate_make().
+        """
+        if not self.valid_layout: return
+        self.valid_layout = False
+        self.request_update()
+    def update_layout(self):
+        """
+        Handle a change of the size of the nested widget
+
+        Since the root has no size preferences of its own, this is
+        equivalent to invalidate_layout().
+        """
+        self.invalidate_layout()
     def add(self, widget):
         """
         Add the given widget to the root
@@ -875,7 +2557,7 @@ class WidgetRoot(object):
         if ch == _curses.KEY_RESIZE:
             self.invalidate_layout()
         elif ch == _curses.KEY_MOUSE:
-            self.event((ch, _curses.getmouse()))
+            self.event((ch, _BACKEND.getmouse()))
         elif isinstance(ch, int) and ch >= 32 and ch < 256:
             if self._decoder:
                 res = self._decoder.decode(_bchr(ch))
@@ -884,27 +2566,305 @@ class WidgetRoot(object):
                 self.event((ch,))
         else:
             self.event((ch,))
-    def main(self):
+    def _drain_input(self):
         """
-        Main loop
+        Process all input that is immediately available
 
-        Revalidates and redraws the widget as necessary, and processes
-        events, all that ad infinitum (or until an exception is thrown).
+        This never blocks.
         """
-        while 1:
-            if not self.valid_layout:
-                self.make()
-            if not self.valid_display:
-                self.redraw()
-            ch = self.window.getch()
-            self._process_input(ch)
-            last_update = _time.time()
-            self.window.nodelay(1)
-            while _time.time() - last_update < 0.1:
+        self.window.nodelay(1)
+        try:
+            while 1:
                 ch = self.window.getch()
                 if ch == -1: break
                 self._process_input(ch)
+        finally:
             self.window.nodelay(0)
+    def _input_fd(self):
+        "Return the file descriptor input arrives on"
+        return _sys.stdin.fileno() if self.infd is None else self.infd
+    def _init_wakeup(self):
+        """
+        Create the pipe used by call_soon_threadsafe() unless done already
+
+        Returns the read end of the pipe. If callbacks have been queued
+        while there was no pipe, the pipe is signalled right away.
+        """
+        with self._calls_lock:
+            if self._wakeup is None:
+                fds = _os.pipe()
+                for fd in fds:
+                    fl = _fcntl.fcntl(fd, _fcntl.F_GETFL)
+                    _fcntl.fcntl(fd, _fcntl.F_SETFL, fl | _os.O_NONBLOCK)
+                self._wakeup = fds
+                if self._calls:
+                    self._calls_pending = True
+                    self._wake()
+            return self._wakeup[0]
+    def _wake(self):
+        "Internal helper; must be called with _calls_lock held"
+        try:
+            _os.write(self._wakeup[1], b'\0')
+        except OSError as exc:
+            if exc.errno not in (_errno.EAGAIN, _errno.EWOULDBLOCK): raise
+    def _run_calls(self):
+        """
+        Run the callbacks queued by call_soon_threadsafe() so far
+
+        If a callback raises an exception, the ones after it stay queued
+        (to be run in the next batch), and the exception is propagated.
+        """
+        try:
+            while _os.read(self._wakeup[0], 4096): pass
+        except OSError as exc:
+            if exc.errno not in (_errno.EAGAIN, _errno.EWOULDBLOCK): raise
+        with self._calls_lock:
+            calls, self._calls = self._calls, _collections.deque()
+            self._calls_pending = False
+        while calls:
+            callback, args = calls.popleft()
+            try:
+                callback(*args)
+            except BaseException:
+                with self._calls_lock:
+                    calls.extend(self._calls)
+                    self._calls = calls
+                    if calls and not self._calls_pending:
+                        self._calls_pending = True
+                        self._wake()
+                raise
+    def close(self):
+        """
+        Release the resources allocated for the main loops
+
+        This closes the pipe used by call_soon_threadsafe(); it is created
+        anew when a main loop is started again, and callbacks submitted in
+        the meantime are run then. main() and run_async() call this when
+        they finish; code driving wait() on its own should do so as well.
+        """
+        with self._calls_lock:
+            if self._wakeup is None: return
+            for fd in self._wakeup:
+                _os.close(fd)
+            self._wakeup = None
+            self._calls_pending = False
+    def call_soon_threadsafe(self, callback, *args):
+        """
+        Schedule callback to be called with args from the main loop
+
+        This may be invoked from any thread. The callbacks are run in the
+        order they have been submitted, in batches between the frames of
+        the main loop (see main() and run_async()), so that they may modify
+        the widget hierarchy freely, and any amount of them submitted in
+        quick succession results in only one redraw.
+        """
+        with self._calls_lock:
+            self._calls.append((callback, args))
+            if self._calls_pending or self._wakeup is None: return
+            self._calls_pending = True
+            self._wake()
+    def watch(self, fd, callback):
+        """
+        Invoke callback whenever the file descriptor fd is readable
+
+        callback is called with fd as the only argument from within wait()
+        (and, hence, main()); it must consume the pending data to avoid
+        being invoked again immediately. A previous callback registered for
+        fd is replaced.
+        """
+        self._watches[fd] = callback
+    def unwatch(self, fd):
+        """
+        Stop watching the file descriptor fd
+
+        Unknown file descriptors are silently ignored.
+        """
+        self._watches.pop(fd, None)
+    def request_update(self):
+        """
+        Arrange for update() to be called soon
+
+        This is invoked whenever valid_display or valid_layout become false,
+        and forwards to the hook installed by the currently active main loop
+        (if that needs one).
+        """
+        if self._update_hook is not None: self._update_hook()
+    def _frame_delay(self):
+        """
+        Return how many seconds update() should be deferred
+
+        This is nonzero if an update is due but would exceed the frame rate
+        limit.
+        """
+        if (self.max_fps is None or self._last_frame is None or
+                self.valid_layout and self.valid_display):
+            return 0
+        delay = self._last_frame + 1.0 / self.max_fps - _clock()
+        return max(delay, 0)
+    def update(self):
+        """
+        Re-layout and redraw the widget tree if necessary
+
+        This does not take the max_fps attribute into account; the main loops
+        do that before calling this.
+        """
+        if self.valid_layout and self.valid_display: return
+        self._last_frame = _clock()
+        if not self.valid_layout:
+            self.make()
+        if not self.valid_display:
+            self.redraw()
+        if self.profiler is not None:
+            self.profiler.end_frame()
+    def wait(self, timeout=None):
+        """
+        Wait for input and process it
+
+        This blocks until input arrives on the infd or on any watched file
+        descriptor, until a callback is submitted via call_soon_threadsafe(),
+        or until timeout seconds have passed (if timeout is not None), and
+        then handles everything that is available: the pending callbacks are
+        run, the callbacks of readable watched file descriptors are invoked,
+        and all pending keystrokes are processed in one batch.
+        """
+        wakeup = self._init_wakeup()
+        fds = [self._input_fd(), wakeup]
+        fds.extend(self._watches)
+        try:
+            readable = _select.select(fds, [], [], timeout)[0]
+        except (_select.error, OSError) as exc:
+            if exc.args[0] != _errno.EINTR: raise
+            readable = []
+        if wakeup in readable:
+            self._run_calls()
+        for fd in readable:
+            callback = self._watches.get(fd)
+            if callback is not None: callback(fd)
+        # Even without apparent input, curses may have a KEY_RESIZE pending.
+        self._drain_input()
+    def main(self):
+        """
+        Main loop
+
+        Revalidates and redraws the widget as necessary, and processes
+        events, all that ad infinitum (or until an exception is thrown).
+        Between redraws, the loop sleeps until input arrives (see wait());
+        all input that arrived in the meantime is handled before the next
+        redraw, so that bursts of keystrokes (such as pastes) are rendered
+        only once.
+        """
+        self._running = True
+        try:
+            while self._running:
+                delay = self._frame_delay()
+                if delay:
+                    timeout = delay
+                    if self.idle_timeout is not None:
+                        timeout = min(timeout, self.idle_timeout)
+                else:
+                    self.update()
+                    timeout = self.idle_timeout
+                self.wait(timeout)
+        finally:
+            self._running = False
+            self.close()
+    def run_async(self, loop=None):
+        """
+        Main loop integrated into an asyncio event loop
+
+        loop is the event loop to use; if None, the running one is used (so
+        that this must then be called from a coroutine or a callback, and
+        raises a RuntimeError otherwise). Instead of blocking, this
+        registers the infd (as well as the file descriptors watched at the
+        time of the call) with the event loop and returns an asyncio Future,
+        which is resolved when stop() is called, or fails with the first
+        exception raised by an event handler (after which the widget root
+        is detached from the loop). Cancelling the future detaches the
+        widget root as well.
+        Redraws are scheduled as a single callback whenever the widget tree
+        is invalidated, so that any amount of updates happening during one
+        iteration of the event loop (or, if max_fps is set, during one frame
+        interval) produces at most one frame.
+        """
+        import asyncio
+        if loop is None:
+            try:
+                loop = asyncio.get_running_loop()
+            except AttributeError:
+                # Python < 3.7.
+                loop = asyncio.get_event_loop()
+        future = loop.create_future()
+        fds, state = [], {'pending': False, 'timer': None}
+        def finish(exc=None):
+            self._running = False
+            self._update_hook = None
+            for fd in fds:
+                loop.remove_reader(fd)
+            self.close()
+            if state['timer'] is not None:
+                state['timer'].cancel()
+            if future.done():
+                pass
+            elif exc is None:
+                future.set_result(None)
+            else:
+                future.set_exception(exc)
+        def guarded(func):
+            def wrapper(*args):
+                if future.done(): return
+                try:
+                    func(*args)
+                except Exception as exc:
+                    finish(exc)
+                except BaseException:
+                    finish()
+                    raise
+                if not self._running: finish()
+            return wrapper
+        @guarded
+        def do_update():
+            delay = self._frame_delay()
+            if delay:
+                loop.call_later(delay, do_update)
+                return
+            state['pending'] = False
+            self.update()
+        def schedule():
+            if state['pending'] or future.done(): return
+            state['pending'] = True
+            delay = self._frame_delay()
+            if delay:
+                loop.call_later(delay, do_update)
+            else:
+                loop.call_soon(do_update)
+        @guarded
+        def on_idle():
+            self._drain_input()
+            if self.idle_timeout is not None:
+                state['timer'] = loop.call_later(self.idle_timeout, on_idle)
+        fds.extend((self._input_fd(), self._init_wakeup()))
+        loop.add_reader(fds[0], guarded(self._drain_input))
+        loop.add_reader(self._wakeup[0], guarded(self._run_calls))
+        for fd, callback in self._watches.items():
+            fds.append(fd)
+            loop.add_reader(fd, guarded(callback), fd)
+        self._running = True
+        self._update_hook = schedule
+        if self.idle_timeout is not None:
+            state['timer'] = loop.call_later(self.idle_timeout, on_idle)
+        # Detach from the loop if the future is cancelled by the caller.
+        future.add_done_callback(lambda f: finish())
+        schedule()
+        return future
+    def stop(self):
+        """
+        Make the currently running main loop return
+
+        Applies to main() and run_async(). From other threads, use
+        call_soon_threadsafe(root.stop).
+        """
+        self._running = False
+        self.request_update()
 
 class Widget(object):
     """
@@ -915,7 +2875,7 @@ class Widget(object):
     Attributes:
     cminsize     : The (custom) minimal size below which the widget must not
                    shrink. Can be used for creating rigid spacers of custom
-                   sizes.
+                   sizes. Changes take effect after invalidate_layout().
     parent       : The parent of this widget in the hierarchy.
     styler       : A Styler instance responsible for this widget. If none
                    set, the paren widget's styler is used.
@@ -960,18 +2920,36 @@ class Widget(object):
         self.grabbing = None
         self.grabbing_full = False
         self.cursor_pos = None
-        self._minsize = None
-        self._prefsize = None
+        self._damage = None
+        self._own_damage = None
+        self._make_only = False
+        self._layout_gen = 0
+        self._minsize = (-1, None)
+        self._prefsize = (-1, None)
     @property
     def minsize(self):
-        "The minimal layout size of this widget"
-        if self._minsize is None: self._minsize = self.getminsize()
-        return maxpos(self._minsize, self.cminsize)
+        """
+        The minimal layout size of this widget
+
+        The value is cached until the next invalidate_layout().
+        """
+        c = self._minsize
+        if c[0] != self._layout_gen:
+            c = (self._layout_gen, maxpos(self.getminsize(), self.cminsize))
+            self._minsize = c
+        return c[1]
     @property
     def prefsize(self):
-        "The preferred layout size of this widget"
-        if self._prefsize is None: self._prefsize = self.getprefsize()
-        return maxpos(self._prefsize, self.cminsize)
+        """
+        The preferred layout size of this widget
+
+        The value is cached until the next invalidate_layout().
+        """
+        c = self._prefsize
+        if c[0] != self._layout_gen:
+            c = (self._layout_gen, maxpos(self.getprefsize(), self.cminsize))
+            self._prefsize = c
+        return c[1]
     @property
     def rect(self):
         "The position concatenated with the size"
@@ -1015,6 +2993,7 @@ class Widget(object):
         mark, and marks the widget for redrawing.
         """
         self.valid_layout = True
+        self._make_only = False
         if self.grabbing:
             gr = list(self.grabbing)
             if gr[2] > self.size[0]: gr[2] = self.size[0]
@@ -1037,11 +3016,17 @@ class Widget(object):
         related to this widget should go into draw_self().
         Well-behaved implementations should return immediately if they are
         still valid.
+        If only a part of the widget has been damaged (see invalidate()),
+        draw_self() is given a ClipWindow restricted to that part.
         """
         if self.valid_display: return
         self.valid_display = True
+        self._damage = None
         if not self.valid_self:
             self.valid_self = True
+            area, self._own_damage = self._own_damage, None
+            if area is not None and area != self.rect:
+                win = clip_window(win, area)
             self.draw_self(win)
     def draw_self(self, win):
         """
@@ -1051,6 +3036,16 @@ class Widget(object):
         The default implementation does nothing.
         """
         pass
+    def paints_background(self):
+        """
+        Return whether draw_self() covers the entire area of this widget
+
+        This is used by Container.make() to find the widget that repaints
+        areas uncovered by rearranged descendants (or left stale by ones
+        that draw only parts of their area). The default implementation
+        returns False.
+        """
+        return False
     def grab_input(self, rect, pos=None, source=None, full=False):
         """
         Render this widget in charge of input
@@ -1129,17 +3124,20 @@ class Widget(object):
         accordingly (i.e. returns False).
         """
         return False
-    def invalidate(self, rec=False, child=None):
+    def invalidate(self, rec=False, child=None, rect=None):
         """
         Mark this widget as in need of a redraw
 
         rec is whether the entire widget tree should be invalidated; child
-        is the child the invalidation request originated from (if any).
+        is the child the invalidation request originated from (if any); rect
+        is the area that has been damaged (in the coordinates of the window
+        the widget is drawn to), defaulting to the widget's rect.
         A widget can be invalidated in multiple ways:
         - Recursive invalidation: If rec is true, the entire widget tree
-          below and including self is invalidated unconditionally. child
-          should be None. valid_display and valid_self (if child is None as
-          specified above) are cleared.
+          below and including self is invalidated unconditionally, except
+          for widgets that do not overlap rect (if given). child should be
+          None. valid_display and valid_self (if child is None as specified
+          above) are cleared.
         - Pinpoint invalidation: If rec is false and child is None, the
           invalidation is aimed at exactly this widget. Both valid_display
           and valid_self are reset, and the request is propagated to the
@@ -1148,25 +3146,90 @@ class Widget(object):
           a child was invalidated and is propagating the request to its
           parent. valid_display is reset (valid_self not), and the request
           is propagated further.
+        The damaged area is accumulated up to the WidgetRoot; a request is
+        only propagated to the parent if either the widget was valid before
+        or the damaged area has grown. The part of it that lies within the
+        widget and has been damaged by the first two kinds of invalidation
+        is what draw() lets draw_self() repaint.
         If a widget (such as a container with multiple children) optimizes
         its rendering, it should flush state related to that on the Python
         condition (rec or child is None).
         """
-        ovd = self.valid_display
+        own = None if self.size is None else self.rect
+        if rect is None:
+            rect = own
+        elif rec and not overlaprect(rect, own):
+            return
+        ovd, odmg = self.valid_display, self._damage
         self.valid_display = False
-        if child is None: self.valid_self = False
-        if ovd and not rec: self.parent.invalidate(child=self)
+        if child is None:
+            self.valid_self = False
+            self._own_damage = (None if own is None else
+                                unionrect(self._own_damage,
+                                          intersectrect(rect, own)))
+        self._damage = unionrect(odmg, rect)
+        if rec: return
+        if ovd or self._damage != odmg:
+            self.parent.invalidate(child=self, rect=rect)
     def invalidate_layout(self):
         """
         Mark this widget as in need of a re-layout
 
-        The standard implementation sets the valid_layout attribute to False
-        and propagates the request to the parent.
+        The standard implementation sets the valid_layout attribute to False,
+        propagates the request to the parent (unless that has already
+        happened), and advances the layout generation, which discards the
+        cached minimum and preferred sizes.
+        Subclasses that cache layout-related values can store the generation
+        (the _layout_gen attribute) along with them instead of hooking this
+        method to reset them.
         """
         ov, self.valid_layout = self.valid_layout, False
-        if ov: self.parent.invalidate_layout()
-        self._minsize = None
-        self._prefsize = None
+        if ov or self._make_only: self.parent.invalidate_layout()
+        self._make_only = False
+        self._layout_gen += 1
+    def invalidate_make(self, child=None):
+        """
+        Mark this widget as in need of a make() without a change of size
+
+        child is the child the request originated from (if any).
+        In contrast to invalidate_layout(), the minimum and preferred sizes
+        of the widget are known to be unchanged, so the parent only needs to
+        re-make this widget in place (instead of laying out all its
+        children anew). The standard implementation sets the valid_layout
+        attribute to False and propagates the request to the parent (unless
+        the widget is already invalid).
+        """
+        if not self.valid_layout: return
+        self.valid_layout = False
+        self._make_only = True
+        self.parent.invalidate_make(self)
+    def update_layout(self):
+        """
+        Mark this widget as in need of a re-layout after a change of content
+
+        In contrast to invalidate_layout(), this recomputes the minimum and
+        preferred sizes of the widget immediately; if they are unchanged,
+        the parent is only asked to re-make this widget in place (see
+        invalidate_make()), and otherwise, the parent's update_layout() is
+        invoked in turn. Thus, only as much of the hierarchy is laid out
+        anew as is affected by the change.
+        If the sizes have not been computed yet, this is equivalent to
+        invalidate_layout().
+        """
+        gen = self._layout_gen
+        if (self._minsize[0] != gen or self._prefsize[0] != gen or
+                self.parent is None):
+            self.invalidate_layout()
+            return
+        old = (self.minsize, self.prefsize)
+        # Reset the cached state without notifying the parent.
+        self.valid_layout = False
+        self._make_only = False
+        self.invalidate_layout()
+        if (self.minsize, self.prefsize) == old:
+            self.parent.invalidate_make(self)
+        else:
+            self.parent.update_layout()
     def _delete_layout(self):
         "Remove the widget from its container"
         if self.parent is not None:
@@ -1211,6 +3274,8 @@ class Container(Widget):
         self.children = []
         self._focused = None
         self._oldrect = None
+        self._lastrect = None
+        self._relaid = False
     def restyle(self):
         """
         Apply this widget's Styler (if any) to it
@@ -1244,20 +3309,72 @@ class Container(Widget):
         Perform layout
 
         The standard implementation aborts if the container is (already)
-        valid; otherwise, if the container's position or size have changed,
-        it invalidates all children, calls the relayout() method, and
-        invokes all children's make() methods. In any case, the container
-        is valid after the procedure.
+        valid; otherwise, if the container's position or size have changed
+        (or its layout has been invalidated), it calls the relayout()
+        method, marks all children as in need of a make(), and invokes all
+        children's make() methods; if not, only those children which have
+        been invalidated individually (see invalidate_make()) are made. The
+        latter also happens if the container's layout has been invalidated
+        but neither the container itself nor any of its children have
+        moved or changed size. In any case, the container is valid after
+        the procedure.
+        When children are moved or resized, the areas they uncover are
+        repainted by the nearest ancestor (including the container itself)
+        whose paints_background() returns true; it redraws its entire
+        subtree.
         """
         if self.valid_layout: return
-        if self._oldrect != self.rect:
-            for i in self.children:
-                i.invalidate_layout()
+        if self._oldrect == self.rect:
+            self._relaid = self._make_children()
+            self.valid_layout = True
+            self._make_only = False
+            return
+        self._make_only = False
+        if self._lastrect == self.rect:
+            places = [(i, i.pos, i.size) for i in self.children]
             self.relayout()
-            for i in self.children:
-                i.make()
-            self._oldrect = self.rect
+            if places == [(i, i.pos, i.size) for i in self.children]:
+                self._relaid = self._make_children()
+                self._oldrect = self.rect
+                self.valid_layout = True
+                return
+        else:
+            self.relayout()
+        for i in self.children:
+            i.invalidate_make()
+        for i in self.children:
+            i.make()
+        self._oldrect = self._lastrect = self.rect
+        # All children are redrawn anyway; only our own background (if we
+        # paint none) may be left stale.
+        self._relaid = not self.paints_background()
         Widget.make(self)
+    def _make_children(self):
+        """
+        Internal layout helper
+
+        Makes the children that are invalid, and returns whether any of
+        them has uncovered areas that our ancestors need to repaint.
+        """
+        relaid = False
+        for i in self.children:
+            if i.valid_layout: continue
+            i.make()
+            relaid |= self._uncovers(i)
+        if relaid and self.paints_background():
+            self.invalidate(True)
+            return False
+        return relaid
+    @staticmethod
+    def _uncovers(widget):
+        """
+        Internal layout helper
+
+        Returns whether widget (which has just been made) may have left
+        stale areas that an ancestor needs to repaint.
+        """
+        if isinstance(widget, Container): return widget._relaid
+        return not widget.paints_background()
     def relayout(self):
         """
         Perform the actual layout of children
@@ -1272,15 +3389,22 @@ class Container(Widget):
         """
         Draw this container to the given window
 
-        The standard implementation aborts if already valid, draws all
-        children recursively, and marks the container as valid.
+        The standard implementation aborts if already valid, draws the
+        children overlapping the area damaged since the last redraw
+        recursively, and marks the container as valid. If win is a
+        ClipWindow, children lying entirely outside its clipping rectangle
+        are skipped (and remain invalid).
         Subclasses should hook draw_self() (which is implicitly called
         if necessary) to display own UI elements.
         """
         if self.valid_display: return
+        damage = self._damage
         Widget.draw(self, win)
+        clip = getattr(win, 'cliprect', None)
         for i in self.children:
-            i.draw(win)
+            if not overlaprect(damage, i.rect): continue
+            if clip is None or overlaprect(clip, i.rect):
+                i.draw(win)
     def event(self, event):
         """
         Process input events directed to this widget
@@ -1332,22 +3456,30 @@ class Container(Widget):
                 return True
         self._refocus(None)
         return False
-    def invalidate(self, rec=False, child=None):
+    def invalidate(self, rec=False, child=None, rect=None):
         """
         Mark this widget as in need of a redraw
 
         rec tells whether the invalidation should propagate to all children
         of the container; child tells which (direct) child of the container
-        the invalidation originated at.
-        The standard implementation actually marks the container itself and
-        propagates the event to the children if rec is true.
+        the invalidation originated at; rect is the damaged area.
+        The standard implementation actually marks the container itself.
+        Unless the request comes from a child, the area draw_self() will
+        repaint may grow (even if rec is false, as that may cover the
+        children); in that case, the children overlapping that area are
+        invalidated recursively.
         Subclasses may need to override this to reset drawing state; see
         Widget.invalidate() for details.
         """
-        Widget.invalidate(self, rec, child)
-        if rec:
+        if rec and self.size is not None and not overlaprect(rect,
+                                                             self.rect):
+            return
+        odmg = self._own_damage
+        Widget.invalidate(self, rec, child, rect)
+        if child is None and (self._own_damage != odmg or
+                              self._own_damage is None):
             for i in self.children:
-                i.invalidate(rec)
+                i.invalidate(True, rect=self._own_damage)
     def invalidate_layout(self):
         """
         Mark this widget as in need of a layout refresh
@@ -1361,6 +3493,16 @@ class Container(Widget):
         Widget.invalidate_layout(self)
         # Force layout recalculation.
         self._oldrect = None
+    def invalidate_make(self, child=None):
+        """
+        Mark this widget as in need of a make() without a change of size
+
+        The standard implementation additionally forces all children to be
+        laid out anew if the request is not coming from a child; see
+        Widget.invalidate_make() for details.
+        """
+        if child is None: self._oldrect = self._lastrect = None
+        Widget.invalidate_make(self, child)
     def _refocus(self, new):
         "Helper method to properly switch focus between two children"
         if new is self._focused: return
@@ -1415,42 +3557,22 @@ class SingleContainer(Container):
 
     Adding a child when one is already present removes the former one.
     """
-    def __init__(self, **kwds):
-        "Initializer"
-        Container.__init__(self, **kwds)
-        self._chms = None
-        self._chps = None
     def _child_minsize(self, **kwds):
         """
         Get the minimum size of the child, or (0, 0) if none
 
         This is a helper method aimed at subclasses.
         """
-        if self._chms is not None:
-            pass
-        elif not self.children:
-            self._chms = (0, 0)
-        else:
-            self._chms = self.children[0].minsize
-        return self._chms
+        if not self.children: return (0, 0)
+        return self.children[0].minsize
     def _child_prefsize(self):
         """
         Get the preferred size of the child, or (0, 0) if none
 
         This is a helper method aimed at subclasses.
         """
-        if self._chps is not None:
-            pass
-        elif not self.children:
-            self._chps = (0, 0)
-        else:
-            self._chps = self.children[0].prefsize
-        return self._chps
-    def invalidate_layout(self):
-        "Signal the need of a relayout"
-        Container.invalidate_layout(self)
-        self._chms = None
-        self._chps = None
+        if not self.children: return (0, 0)
+        return self.children[0].prefsize
     def add(self, widget, **config):
         "Add a child"
         while self.children:
@@ -1651,6 +3773,9 @@ class BoxContainer(VisibilityContainer):
         BoxWidget.draw_box(win, self._box_rect[:2], self._box_rect[2:],
                            self.attr_box, self.ch_box, self.border)
         VisibilityContainer.draw_self(self, win)
+    def paints_background(self):
+        "Return whether the margin is filled"
+        return self.attr_margin is not None
     def invalidate_layout(self):
         "Mark this widget as in need of a layout refresh"
         VisibilityContainer.invalidate_layout(self)
@@ -1693,6 +3818,7 @@ class AlignContainer(VisibilityContainer):
         self.align = parse_pair(kwds.get('align', ALIGN_CENTER))
         self._pads = (0, 0, 0, 0)
         self._wbox = None
+        self._wboxkey = None
     def inner_minsize(self):
         "Get the minimum size of this widget"
         pms, sp = VisibilityContainer.inner_minsize(self), self._pads
@@ -1704,7 +3830,9 @@ class AlignContainer(VisibilityContainer):
     def relayout(self):
         "Perform a layout refresh"
         sp = self._pads
-        if self._wbox is None:
+        key = (self._layout_gen, self.rect)
+        if self._wboxkey != key:
+            self._wboxkey = key
             rchps = self._child_prefsize()
             chps = (sp[3] + rchps[0] + sp[1], sp[0] + rchps[1] + sp[2])
             self._wbox = self.calc_wbox(chps, self.size, self.scale,
@@ -1714,10 +3842,6 @@ class AlignContainer(VisibilityContainer):
             self.children[0].pos = (sp[3] + wb[0], sp[0] + wb[1])
             self.children[0].size = (wb[2] - sp[3] - sp[1],
                                      wb[3] - sp[0] - sp[2])
-    def invalidate_layout(self):
-        "Mark this widget as in need of a layout refresh"
-        VisibilityContainer.invalidate_layout(self)
-        self._wbox = None
 
 class TeeContainer(AlignContainer):
     """
@@ -1736,7 +3860,7 @@ class TeeContainer(AlignContainer):
         "Initializer"
         AlignContainer.__init__(self, **kwds)
         self.tees = parse_pair(kwds.get('tees',
-            (_curses.ACS_RTEE, _curses.ACS_LTEE)))
+            (_BACKEND.ACS_RTEE, _BACKEND.ACS_LTEE)))
         self.attrs = parse_pair(kwds.get('attrs', 0))
         self._pads = (0, 1, 0, 1)
     def draw_self(self, win):
@@ -1745,10 +3869,9 @@ class TeeContainer(AlignContainer):
             at = (self.attrs, self.attrs)
         else:
             at = self.attrs
-        sw = win.derwin(self._wbox[3], self._wbox[2],
-                        self._wbox[1], self._wbox[0])
-        sw.addch(0, 0, self.tees[0], at[0])
-        sw.insch(self._wbox[3] - 1, self._wbox[2] - 1, self.tees[1], at[1])
+        x, y, w, h = self._wbox
+        draw_char(win, (x, y), self.tees[0], at[0])
+        draw_char(win, (x + w - 1, y + h - 1), self.tees[1], at[1])
         AlignContainer.draw_inner(self, win)
 
 class Viewport(Scrollable, SingleContainer):
@@ -1759,6 +3882,12 @@ class Viewport(Scrollable, SingleContainer):
     displays part of the pad in its display area. Thus, the child can be
     (significantly) larger than the viewport itself.
 
+    By default, the pad holds the entire child. In clipping mode, it only
+    covers the visible area plus an "overscan" margin around it, and the
+    child is drawn through a ClipWindow, so that only the parts of it
+    that fall into the pad are rendered; when the viewport is scrolled
+    beyond the pad, the latter is moved and filled anew.
+
     Attributes are:
     restrict_size: Attempt to adapt the child to the viewport's size as far
                    as possible: if the viewport's width/height is between the
@@ -1774,12 +3903,19 @@ class Viewport(Scrollable, SingleContainer):
     default_ch   : The "default" character of the offscreen pad.
     background   : The background attribute of the offscreen pad.
     background_ch: The background character of the offscreen pad.
+    clip         : Whether to use clipping mode. Defaults to False.
+    overscan     : In clipping mode, the amount of columns and rows by
+                   which the pad extends beyond the visible area in each
+                   direction. Can be a single number or an (x, y) pair;
+                   defaults to zero.
     """
     STYLE_ATTRS = {'background': 'background'}
     def __init__(self, **kwds):
         "Initializer"
         SingleContainer.__init__(self, **kwds)
         Scrollable.__init__(self)
+        self.clip = kwds.get('clip', False)
+        self.overscan = parse_pair(kwds.get('overscan', 0))
         self.restrict_size = kwds.get('restrict_size', True)
         self.cmaxsize = kwds.get('cmaxsize', (None, None))
         self.default_attr = kwds.get('default_attr', None)
@@ -1789,6 +3925,8 @@ class Viewport(Scrollable, SingleContainer):
         self.focusable = False
         self.padsize = (0, 0)
         self._pad = None
+        self._padrect = None
+        self._refill = False
         self._curpos = None
     def getminsize(self):
         "Obtain the minimum size of this widget"
@@ -1822,35 +3960,105 @@ class Viewport(Scrollable, SingleContainer):
             zbound(self.scrollpos[0], self.maxscrollpos[0]),
             zbound(self.scrollpos[1], self.maxscrollpos[1]))
         self.on_scroll(oldpos)
+    def make(self):
+        "Perform a layout refresh"
+        if self.valid_layout: return
+        SingleContainer.make(self)
+        # The pad covers our entire area, so our ancestors need not repaint
+        # anything; the pad itself, however, is refilled if the child has
+        # left stale areas on it.
+        if (self._relaid and self.children and
+                self._uncovers(self.children[0])):
+            self._refill = True
+        self._relaid = False
+    def _exposed(self, oldsize, newsize):
+        "Internal helper"
+        ret = []
+        if newsize[0] > oldsize[0]:
+            ret.append((oldsize[0], 0, newsize[0] - oldsize[0], newsize[1]))
+        if newsize[1] > oldsize[1]:
+            ret.append((0, oldsize[1], min(oldsize[0], newsize[0]),
+                        newsize[1] - oldsize[1]))
+        return [r for r in ret if r[2] and r[3]]
+    def _pad_rect(self):
+        """
+        Return the area of the child the pad should cover
+
+        Outside of clipping mode, this is the whole child; otherwise, the
+        current area is kept as long as it contains the visible part of the
+        child.
+        """
+        if not self.clip: return (0, 0) + self.padsize
+        sp, sz, ps, ov = self.scrollpos, self.size, self.padsize, self.overscan
+        w = min(sz[0] + 2 * ov[0], ps[0])
+        h = min(sz[1] + 2 * ov[1], ps[1])
+        r = self._padrect
+        if (r is not None and r[2:] == (w, h) and r[0] <= sp[0] and
+                r[1] <= sp[1] and sp[0] + sz[0] <= r[0] + w and
+                sp[1] + sz[1] <= r[1] + h):
+            return r
+        return (zbound(sp[0] - ov[0], ps[0] - w),
+                zbound(sp[1] - ov[1], ps[1] - h), w, h)
     def draw_self(self, win):
         "Draw this widget to the given window"
         Widget.draw_self(self, win)
-        chsz = self.padsize
+        padrect, oldrect = self._pad_rect(), self._padrect
+        chsz = padrect[2:]
+        # The pad is retained across relayouts; when it only changes its
+        # size (or is shifted vertically), just the newly exposed strips
+        # need to be filled in, unless the child has left stale areas on
+        # it (see make()).
         if self._pad is None:
-            self._pad = _curses.newpad(chsz[1] + 1, chsz[0] + 1)
+            self._pad = new_pad(win, chsz[1] + 1, chsz[0] + 1)
             if self.default_attr is not None:
                 self._pad.bkgd(self.default_ch, self.default_attr)
-            pad_changed = True
+            exposed = None
         else:
-            padsz = self._pad.getmaxyx()
-            if padsz[1] != chsz[0] + 1 or padsz[0] != chsz[1] + 1:
+            if oldrect[2:] != chsz:
                 self._pad.resize(chsz[1] + 1, chsz[0] + 1)
-                pad_changed = True
+            dy = padrect[1] - oldrect[1]
+            if self._refill:
+                exposed = None
+                if self.background is None: self._pad.erase()
+            elif (padrect[0] == oldrect[0] and oldrect[2:] == chsz and
+                    abs(dy) < chsz[1] and dy and
+                    scroll_window(self._pad, (0, 0, chsz[0] + 1, chsz[1]),
+                                  dy)):
+                # Moved vertically (in clipping mode); shift the contents
+                # and fill in what has been scrolled in.
+                exposed = [(0, chsz[1] - dy if dy > 0 else 0, chsz[0],
+                            abs(dy))]
+            elif oldrect[:2] != padrect[:2]:
+                exposed = None
             else:
-                pad_changed = False
-        if pad_changed:
+                exposed = self._exposed(oldrect[2:], chsz)
+        self._padrect, self._refill = padrect, False
+        if exposed is None and self.background is not None:
+            fill_rect(self._pad, (0, 0, chsz[0] + 1, chsz[1] + 1),
+                      self.background_ch, self.background)
+        if exposed is None and self.children:
+            self.children[0].invalidate(True, rect=(padrect if self.clip
+                                                    else None))
+        if self.children:
+            if self.clip:
+                self.children[0].draw(ClipWindow(self._pad, padrect,
+                                                 self.padsize))
+            else:
+                self.children[0].draw(self._pad)
+        # Exposed strips are redrawn through a window clipped to them, so
+        # that the (already valid) content around them stays intact.
+        for r in (exposed or ()):
             if self.background is not None:
-                fill = self._pad.derwin(0, 0)
-                fill.bkgd(self.background_ch, self.background)
-                fill.clear()
+                fill_rect(self._pad, r, self.background_ch, self.background)
             if self.children:
-                self.children[0].invalidate(True)
-        if self.children:
-            self.children[0].draw(self._pad)
-        sp = self.scrollpos
-        self._pad.overwrite(win, sp[1], sp[0], self.pos[1], self.pos[0],
-                            self.pos[1] + self.size[1] - 1,
-                            self.pos[0] + self.size[0] - 1)
+                cr = addpos(r[:2], padrect[:2]) + r[2:]
+                self.children[0].invalidate(True, rect=cr)
+                self.children[0].draw(ClipWindow(self._pad, cr, self.padsize,
+                                                 padrect[:2]))
+        sp = subpos(self.scrollpos, padrect[:2])
+        overwrite_window(self._pad, win, sp[1], sp[0], self.pos[1],
+                         self.pos[0], self.pos[1] + self.size[1] - 1,
+                         self.pos[0] + self.size[0] - 1)
     def event(self, event):
         "Handle an event"
         ret = SingleContainer.event(self, event)
@@ -1885,22 +4093,192 @@ class Viewport(Scrollable, SingleContainer):
                 pos = None
         # Let parent class handle the rest.
         SingleContainer.grab_input(self, rect, pos, source, full)
-    def invalidate(self, rec=False, child=None):
+    def invalidate(self, rec=False, child=None, rect=None):
         "Mark this widget as in need of a redraw"
         # Child is rendered to offscreen pad, and cannot be invalidated
         # by anything that happens to me (invalidated in draw() if
-        # necessary).
-        Widget.invalidate(self, rec)
-    def invalidate_layout(self):
-        "Mark this widget as in need of a layout refresh"
-        SingleContainer.invalidate_layout(self)
-        self._pad = None
+        # necessary). For the same reason, areas damaged by the child are
+        # in the wrong coordinate space.
+        if child is not None: rect = None
+        Widget.invalidate(self, rec, rect=rect)
+    def on_scroll(self, oldpos):
+        "Handle a scroll event"
+        Scrollable.on_scroll(self, oldpos)
+        if self._focused is not None:
+            self.grab_input(None, pos=self._curpos, _scroll=False)
+        self.invalidate()
+
+class VirtualList(Scrollable, Container):
+    """
+    A scrollable list of uniformly tall rows that are created on demand
+
+    Instead of holding one widget per row, a VirtualList only keeps as many
+    row widgets as fit into its display area; those are recycled when the
+    list is scrolled or resized, and filled in by the renderer callback.
+    Thus, the cost of layout and scrolling depends on the size of the
+    VirtualList instead of the amount of rows it shows.
+
+    The scrolling position is measured in rows (so that scrollpos[1] is the
+    index of the topmost visible row), and contentsize and maxscrollpos are
+    maintained accordingly; scroll bars can be bound as usual. To bring a
+    row into view, use scroll_to((0, index)).
+
+    The preferred height is the total height of all rows; the width is
+    determined by the row widgets that currently exist (only the first row
+    before the list is laid out), so set cminsize to reserve a specific
+    width. The rows are laid out at the full width of the list.
+
+    Attributes are:
+    count        : The amount of rows. Changes take effect after
+                   invalidate_layout().
+    renderer     : A callable of two arguments, the row widget and the
+                   index of the row it is to display, which updates the
+                   widget accordingly. Row widgets are reused for different
+                   rows over time.
+    factory      : A callable creating a new (blank) row widget. Defaults
+                   to Label.
+    row_height   : The height of every row. Changes take effect after
+                   invalidate_layout().
+    cmaxsize     : The maximum size of the VirtualList.
+    background   : The attribute to fill the area not covered by rows with.
+                   Can be None to leave it alone, which is the default.
+    background_ch: The character to fill the background with.
+    """
+    STYLE_ATTRS = {'background': 'background'}
+    def __init__(self, count, renderer, factory=None, **kwds):
+        "Initializer"
+        Container.__init__(self, **kwds)
+        Scrollable.__init__(self)
+        self.count = count
+        self.renderer = renderer
+        self.factory = Label if factory is None else factory
+        self.row_height = kwds.get('row_height', 1)
+        self.cmaxsize = parse_pair(kwds.get('cmaxsize'))
+        self.background = kwds.get('background', None)
+        self.background_ch = kwds.get('background_ch', '\0')
+        self.focusable = False
+        self._rows = {}
+        self._free = []
+        self._rendering = False
+    def _new_row(self):
+        "Internal helper"
+        w = self.factory()
+        w.parent = self
+        w.restyle()
+        return w
+    def _render(self, widget, index):
+        "Internal helper"
+        # Rows are re-rendered while we are being laid out; their requests
+        # to lay us out anew are ignored meanwhile.
+        self._rendering = True
+        try:
+            self.renderer(widget, index)
+        finally:
+            self._rendering = False
+    def _sample_rows(self):
+        "Internal layout helper"
+        if self.children or not self.count: return self.children
+        if not self._free:
+            self._free.append(self._new_row())
+        self._render(self._free[-1], 0)
+        return self._free[-1:]
+    def getminsize(self):
+        "Obtain the minimum size of this widget"
+        ms = (max([0] + [w.minsize[0] for w in self._sample_rows()]),
+              min(self.row_height, self.count * self.row_height))
+        cm = self.cmaxsize
+        return ((ms[0] if cm[0] is None else min(ms[0], cm[0])),
+                (ms[1] if cm[1] is None else min(ms[1], cm[1])))
+    def getprefsize(self):
+        "Obtain the preferred size of this widget"
+        ps = (max([0] + [w.prefsize[0] for w in self._sample_rows()]),
+              self.count * self.row_height)
+        cm = self.cmaxsize
+        return ((ps[0] if cm[0] is None else min(ps[0], cm[0])),
+                (ps[1] if cm[1] is None else min(ps[1], cm[1])))
+    def relayout(self):
+        "Perform a layout refresh"
+        rh = self.row_height
+        visible = (self.size[1] // rh if rh > 0 else 0)
+        self.contentsize = (self.size[0], self.count)
+        self.maxscrollpos = (0, max(self.count - visible, 0))
+        self.scrollpos[:] = (0, zbound(self.scrollpos[1],
+                                       self.maxscrollpos[1]))
+        top = self.scrollpos[1]
+        self._show(range(top, min(top + visible, self.count)))
+        x, y = self.pos
+        for w in self.children:
+            w.pos = (x, y)
+            w.size = (self.size[0], rh)
+            y += rh
+        self.update_scrollbars()
+    def _show(self, indices):
+        "Internal layout helper"
+        # Rows that remain visible keep their widgets; the others are
+        # recycled for the newly exposed ones. The focus does not follow a
+        # widget to another row.
+        if self._focused is not None:
+            for i, w in self._rows.items():
+                if w is self._focused and i not in indices:
+                    self._refocus(None)
+                    break
+        rows = {}
+        for i in indices:
+            w = self._rows.pop(i, None)
+            if w is not None: rows[i] = w
+        free = self._free
+        free.extend(self._rows.values())
+        for i in indices:
+            if i in rows: continue
+            w = free.pop() if free else self._new_row()
+            self._render(w, i)
+            w.invalidate_make()
+            rows[i] = w
+        self._rows = rows
+        self.children[:] = [rows[i] for i in indices]
+    def draw_self(self, win):
+        "Draw this widget to the given window"
+        Container.draw_self(self, win)
+        if self.background is not None:
+            BoxWidget.draw_box(win, self.pos, self.size, self.background,
+                               self.background_ch, False)
+    def paints_background(self):
+        "Return whether a background is drawn"
+        return self.background is not None
+    def event(self, event):
+        "Handle an event"
+        ret = Container.event(self, event)
+        if not ret:
+            if self.scroll_event(event, self):
+                return True
+        return ret
+    def update_layout(self):
+        "Mark this widget as in need of a re-layout after a change of content"
+        if self._rendering: return
+        Container.update_layout(self)
     def on_scroll(self, oldpos):
         "Handle a scroll event"
         Scrollable.on_scroll(self, oldpos)
-        if self._focused is not None:
-            self.grab_input(None, pos=self._curpos, _scroll=False)
-        self.invalidate()
+        # Lay the rows out anew without changing the size.
+        self.invalidate_make()
+    def refresh(self, index=None):
+        """
+        Render the row with the given index anew
+
+        If index is None, all visible rows are re-rendered. This should be
+        called whenever the data displayed by the rows change; rows that are
+        not visible are rendered anyway when they are scrolled into view.
+        """
+        for i, w in self._rows.items():
+            if index is not None and i != index: continue
+            self._render(w, i)
+            if not w.valid_layout: self.invalidate_make(w)
+    def add(self, widget, **config):
+        "Adding children explicitly is not supported"
+        raise TypeError('Cannot add children to a VirtualList')
+    def remove(self, widget):
+        "Removing children explicitly is not supported"
+        raise TypeError('Cannot remove children from a VirtualList')
 
 class StackContainer(Container):
     """
@@ -1924,15 +4302,17 @@ class StackContainer(Container):
         for w in self.children:
             w.pos = self.pos
             w.size = self.size
-    def invalidate(self, rec=False, child=None):
+    def invalidate(self, rec=False, child=None, rect=None):
         "Mark this container as in need of a redraw"
         if child in self.children:
-            Container.invalidate(self, rec, child)
+            Container.invalidate(self, rec, child, rect)
+            # Only the widgets stacked above the damaged area need to be
+            # redrawn.
             idx = self.children.index(child)
             for i in self.children[idx + 1:]:
-                i.invalidate(True)
+                i.invalidate(True, rect=rect)
         else:
-            Container.invalidate(self, True, child)
+            Container.invalidate(self, rec, None, rect)
     def add(self, widget, **config):
         """
         Add another child to this container
@@ -2078,38 +4458,33 @@ class MarginContainer(Container):
         self._slots = {}
         self._revslots = {}
         self._presizes = None
+        self._prekey = None
+        self._rawminsize = None
+        self._rawprefsize = None
         self._boxes = None
+        self._boxkey = None
     def getminsize(self):
         "Calculate the minimum size of this container"
         self._make_preboxes()
-        return self._minsize
+        return self._rawminsize
     def getprefsize(self):
         "Calculate the preferred size of this container"
         self._make_preboxes()
-        return self._prefsize
+        return self._rawprefsize
     def relayout(self):
         "Perform a layout refresh"
         self._make_boxes(self.size)
         for w, pos, size in self._boxes:
             w.pos = addpos(self.pos, pos)
             w.size = size
-    def invalidate_layout(self):
-        "Mark this widget as in need of a layout refresh"
-        Container.invalidate_layout(self)
-        self._presizes = None
-        self._boxes = None
-    def invalidate(self, rec=False, child=None):
-        "Mark this widget as in need of a redraw"
-        Container.invalidate(self, rec, child)
-        if child is None:
-            for ch in self.children:
-                if self._slots[ch] == self.POS_CENTER: continue
-                ch.invalidate(True)
     def draw_self(self, win):
         "Draw this widget to the given window"
         BoxWidget.draw_box(win, self.pos, self.size, self.background,
                            self.background_ch, self.border)
         Container.draw_self(self, win)
+    def paints_background(self):
+        "Return whether a background is drawn"
+        return self.background is not None
     def add(self, widget, **config):
         """
         Add the given child to this container
@@ -2133,10 +4508,11 @@ class MarginContainer(Container):
         del self._slots[widget]
     def _make_preboxes(self):
         "Internal helper method for layout"
-        if self._presizes is not None: return
+        if self._prekey == self._layout_gen: return
+        self._prekey = self._layout_gen
         if not self.children:
-            self._minsize = inflate((0, 0), self.insets)
-            self._prefsize = inflate((0, 0), self.insets)
+            self._rawminsize = inflate((0, 0), self.insets)
+            self._rawprefsize = inflate((0, 0), self.insets)
             self._presizes = ((0, 0, 0),) * 4
             return
         mws, mhs = [0, 0, 0], [0, 0, 0]
@@ -2155,12 +4531,14 @@ class MarginContainer(Container):
             mhs[2], phs[2] = max(mhs[2], 1), max(phs[2], 1)
         if self.border[3] and not self.insets[3]:
             mws[0], pws[0] = max(mws[0], 1), max(pws[0], 1)
-        self._minsize = inflate((sum(mws), sum(mhs)), self.insets)
-        self._prefsize = inflate((sum(pws), sum(phs)), self.insets)
+        self._rawminsize = inflate((sum(mws), sum(mhs)), self.insets)
+        self._rawprefsize = inflate((sum(pws), sum(phs)), self.insets)
         self._presizes = (mws, mhs, pws, phs)
     def _make_boxes(self, size):
         "Internal helper method for layout"
-        if self._boxes is not None: return
+        key = (self._layout_gen, size)
+        if self._boxkey == key: return
+        self._boxkey = key
         self._make_preboxes()
         mws, mhs, pws, phs = self._presizes
         bx, by, bw, bh = deflate((0, 0, size[0], size[1]), self.insets)
@@ -2245,44 +4623,51 @@ class LinearContainer(Container):
     @classmethod
     def _make_groups(cls, initial, mins, advances, weights, sweights):
         "Internal layout helper"
-        glengths, gmins, gsizes, gweights, gsweights = [], [], [], [], []
-        first = True
-        for i, m, a, w, s in zip(initial, mins, advances, weights, sweights):
-            if a or first:
-                first = False
-                glengths.append(0)
-                gmins.append(0)
-                gsizes.append(0)
-                gweights.append(0)
-                gsweights.append(1)
-            glengths[-1] += 1
-            gmins[-1] = max(gmins[-1], m)
-            gsizes[-1] = max(gsizes[-1], i)
-            gweights[-1] = w
-            gsweights[-1] = s
+        indices, starts = group_indices(advances)
+        ends = starts[1:] + [len(advances)]
+        glengths = [e - s for s, e in zip(starts, ends)]
+        gmins = group_max(indices, mins, len(starts))
+        gsizes = group_max(indices, initial, len(starts))
+        # The weights of a group are those of its last member.
+        gweights = [weights[e - 1] for e in ends]
+        gsweights = [sweights[e - 1] for e in ends]
         return (glengths, gmins, gsizes, gweights, gsweights)
     @classmethod
     def _unpack_groups(cls, values, lengths):
         "Internal layout helper"
-        return sum(((v,) * l for v, l in zip(values, lengths)), ())
+        ret = []
+        for v, l in zip(values, lengths):
+            ret.extend((v,) * l)
+        return tuple(ret)
     @classmethod
     def _shrink(cls, r, full, gmins, gsweights):
-        "Internal layout helper"
-        while 1:
-            indices, weights, diffs = [], [], []
-            for i, w in enumerate(gsweights):
-                if w == 0: continue
-                d = gmins[i] - r[i]
-                if d >= 0: continue
-                indices.append(i)
-                weights.append(w)
-                diffs.append(d)
-            if not indices: break
-            incs = [max(i, j) for i, j in zip(diffs,
-                weight_distrib(full - sum(r), weights))]
+        """
+        Internal layout helper
+
+        Every round distributes the remaining excess E amongst the groups
+        that can still shrink (of total shrinking weight W); since a group
+        taking part in a round has at least one cell to spare, the groups
+        that hit their minimum return less than their share of the excess,
+        so that the next round either has less than half of E or less than
+        half of W to work with. There are thus O(log E + log W) rounds of
+        linear cost each.
+        """
+        # The groups that hit their minimum drop out of subsequent rounds;
+        # the round structure itself is retained since the rounding of
+        # weight_distrib() depends on which groups take part in each round.
+        indices = [i for i, w in enumerate(gsweights)
+                   if w != 0 and gmins[i] < r[i]]
+        total = sum(r)
+        while indices and total != full:
+            incs = weight_distrib(full - total,
+                                  [gsweights[i] for i in indices])
+            left = []
             for idx, inc in zip(indices, incs):
+                inc = max(gmins[idx] - r[idx], inc)
                 r[idx] += inc
-            if sum(r) == full: break
+                total += inc
+                if gmins[idx] < r[idx]: left.append(idx)
+            indices = left
         return r
     @classmethod
     def _distrib_normal(cls, full, initial, mins, advances, weights,
@@ -2305,26 +4690,83 @@ class LinearContainer(Container):
             r = gsizes
         return cls._unpack_groups(r, glengths)
     @classmethod
+    def _pin_equal(cls, full, initial):
+        """
+        Internal layout helper
+
+        Return the sizes of the items in MODE_EQUAL before they are shrunk:
+        The space is shared equally, and the items whose preferred sizes do
+        not fit into their share are pinned at those; this is repeated with
+        the remaining space and items until no (unpinned) item exceeds its
+        share. The shares are assigned like by linear_distrib().
+        The items are visited in order of decreasing preferred size, and the
+        position of an item amongst the unpinned ones (which determines
+        whether its share is rounded up) is maintained in a binary indexed
+        tree, so that this takes O(n log n) time.
+        """
+        n = len(initial)
+        # Binary indexed tree counting the unpinned items.
+        tree = [0] * (n + 1)
+        for i in range(1, n + 1):
+            tree[i] += 1
+            j = i + (i & -i)
+            if j <= n: tree[j] += tree[i]
+        def share(idx):
+            r, i = 0, idx
+            while i:
+                r += tree[i]
+                i -= i & -i
+            return base + ((r + 2) * rem) // m - ((r + 1) * rem) // m
+        def pin(idx):
+            i = idx + 1
+            while i <= n:
+                tree[i] -= 1
+                i += i & -i
+        order = sorted(range(n), key=initial.__getitem__, reverse=True)
+        pinned = [False] * n
+        top, m, left = 0, n, full
+        while m:
+            base, rem = divmod(left, m)
+            # The unpinned items are order[top:]. Those larger than base
+            # exceed their share unless that is rounded up to just their
+            # size; items of size base are pinned if their share is not
+            # rounded up; smaller ones always fit. All shares must be
+            # computed before any pinning happens.
+            a = top
+            while a < n and initial[order[a]] > base: a += 1
+            if a == top: break
+            if (initial[order[top]] == base + 1 and
+                    all(share(idx) != base for idx in order[top:a])):
+                break
+            b = a
+            while b < n and initial[order[b]] == base: b += 1
+            keep = []
+            for idx in order[a:b]:
+                if share(idx) == base:
+                    pinned[idx] = True
+                else:
+                    keep.append(idx)
+            for idx in order[top:a]:
+                pinned[idx] = True
+            for idx in order[top:b]:
+                if pinned[idx]:
+                    pin(idx)
+                    left -= initial[idx]
+                    m -= 1
+            top = b - len(keep)
+            order[top:b] = keep
+        shares = iter(linear_distrib(left, m))
+        return [initial[i] if pinned[i] else next(shares) for i in range(n)]
+    @classmethod
     def _distrib_equal(cls, full, initial, mins, advances, weights,
                        sweights, mode):
         "Internal layout helper"
         glengths, gmins, gsizes, gweights, gsweights = cls._make_groups(
             initial, mins, advances, weights, sweights)
-        distr = linear_distrib(full, len(advances))
-        if mode != cls.MODE_EQUAL_FORCE:
-            while True:
-                if all((i <= d) for i, d in zip(initial, distr)): break
-                used, fitting = 0, []
-                for n, (i, d) in enumerate(zip(initial, distr)):
-                    if i < d:
-                        fitting.append(n)
-                    else:
-                        distr[n] = i
-                        used += i
-                if not fitting: break
-                ndis = linear_distrib(full - used, len(fitting))
-                for n, l in zip(fitting, ndis):
-                    distr[n] = l
+        if mode == cls.MODE_EQUAL_FORCE:
+            distr = linear_distrib(full, len(advances))
+        else:
+            distr = cls._pin_equal(full, initial)
             if sum(distr) > full:
                 distr = cls._shrink(distr, full, gmins, (1,) * len(gmins))
         return cls._unpack_groups(distr, glengths)
@@ -2357,26 +4799,25 @@ class LinearContainer(Container):
         self._sweights_x = {}
         self._sweights_y = {}
         self._preboxes = None
+        self._prekey = None
+        self._rawminsize = None
+        self._rawprefsize = None
         self._boxes = None
+        self._boxkey = None
     def getminsize(self):
         "Calculate the minimum size of this container"
         self._make_preboxes()
-        return self._minsize
+        return self._rawminsize
     def getprefsize(self):
         "Calculate the preferred size of this container"
         self._make_preboxes()
-        return self._prefsize
+        return self._rawprefsize
     def relayout(self):
         "Perform a layout refresh"
         self._make_boxes(self.size)
         for w, xy, wh in self._boxes:
             w.pos = addpos(self.pos, xy)
             w.size = wh
-    def invalidate_layout(self):
-        "Mark this container as in need of a layout refresh"
-        Container.invalidate_layout(self)
-        self._preboxes = None
-        self._boxes = None
     def add(self, widget, **config):
         """
         Add a new child to the container
@@ -2416,60 +4857,49 @@ class LinearContainer(Container):
         del self._sweights_y[widget]
     def _make_preboxes(self):
         "Internal layout helper"
-        if self._preboxes is not None: return
-        cpp, cpm, mps, mms = (0, 0), (0, 0), (0, 0), (0, 0)
-        amnt, tps, tms = [0, 0], (0, 0), (0, 0)
-        self._preboxes = []
-        for w in self.children:
-            ps, ms, r = w.prefsize, w.minsize, self._rules[w]
-            mps, mms = maxpos(mps, ps), maxpos(mms, ms)
-            self._preboxes.append((w, tuple(ps), tuple(ms)))
-            tps = maxpos(tps, (cpp[0] + ps[0], cpp[1] + ps[1]))
-            tms = maxpos(tms, (cpm[0] + ms[0], cpm[1] + ms[1]))
-            amnt[0] += r.advances[0]
-            amnt[1] += r.advances[1]
-            cpp = (cpp[0] + ps[0] * r.advances[0],
-                   cpp[1] + ps[1] * r.advances[1])
-            cpm = (cpm[0] + ms[0] * r.advances[0],
-                   cpm[1] + ms[1] * r.advances[1])
-        tps = list(tps)
+        if self._prekey == self._layout_gen: return
+        self._prekey = self._layout_gen
+        self._preboxes = [(w, tuple(w.prefsize), tuple(w.minsize))
+                          for w in self.children]
+        advances = [self._rules[w].advances for w in self.children]
+        ax, ay = [a[0] for a in advances], [a[1] for a in advances]
+        px = [b[1][0] for b in self._preboxes]
+        py = [b[1][1] for b in self._preboxes]
+        tps = [extent(px, ax), extent(py, ay)]
+        tms = (extent([b[2][0] for b in self._preboxes], ax),
+               extent([b[2][1] for b in self._preboxes], ay))
         if self.mode_x in (self.MODE_EQUAL, self.MODE_EQUAL_FORCE):
-            tps[0] = mps[0] * amnt[0]
+            tps[0] = max([0] + px) * sum(ax)
         if self.mode_y in (self.MODE_EQUAL, self.MODE_EQUAL_FORCE):
-            tps[1] = mps[1] * amnt[1]
-        self._prefsize = tps
-        self._minsize = tms
+            tps[1] = max([0] + py) * sum(ay)
+        self._rawprefsize = tps
+        self._rawminsize = tms
     def _make_boxes(self, size):
         "Internal layout helper"
-        if self._boxes is not None: return
+        key = (self._layout_gen, size)
+        if self._boxkey == key: return
+        self._boxkey = key
         self._make_preboxes()
         if len(self._preboxes) == 0:
             self._boxes = []
             return
-        sizes, mins, advances, weights, sweights = [], [], [], [], []
-        for w, wh, ms in self._preboxes:
-            sizes.append(wh)
-            mins.append(ms)
-            advances.append(self._rules[w].advances)
-            weights.append((self._weights_x[w], self._weights_y[w]))
-            sweights.append((self._sweights_x[w], self._sweights_y[w]))
-        zl = tuple(zip(*sizes))
-        zm = tuple(zip(*mins))
-        za = tuple(zip(*advances))
-        zw = tuple(zip(*weights))
-        zs = tuple(zip(*sweights))
-        esizes = zip(self.distribute(size[0], zl[0], zm[0],
-                                     za[0], zw[0], zs[0], self.mode_x),
-                     self.distribute(size[1], zl[1], zm[1],
-                                     za[1], zw[1], zs[1], self.mode_y))
-        esizes = list(esizes)
-        self._boxes = []
-        cp = (0, 0)
-        for w, s in zip(self.children, esizes):
-            self._boxes.append((w, cp, s))
-            r = self._rules[w]
-            cp = (cp[0] + s[0] * r.advances[0],
-                  cp[1] + s[1] * r.advances[1])
+        widgets = [b[0] for b in self._preboxes]
+        advances = [self._rules[w].advances for w in widgets]
+        ax, ay = [a[0] for a in advances], [a[1] for a in advances]
+        sx = self.distribute(size[0], [b[1][0] for b in self._preboxes],
+                             [b[2][0] for b in self._preboxes], ax,
+                             [self._weights_x[w] for w in widgets],
+                             [self._sweights_x[w] for w in widgets],
+                             self.mode_x)
+        sy = self.distribute(size[1], [b[1][1] for b in self._preboxes],
+                             [b[2][1] for b in self._preboxes], ay,
+                             [self._weights_y[w] for w in widgets],
+                             [self._sweights_y[w] for w in widgets],
+                             self.mode_y)
+        self._boxes = list(zip(widgets,
+                               zip(prefix_offsets(sx, ax),
+                                   prefix_offsets(sy, ay)),
+                               zip(sx, sy)))
 
 class HorizontalContainer(LinearContainer):
     """
@@ -2525,16 +4955,20 @@ class GridContainer(Container):
         self._rowConfig = {}
         self._presizes = None
         self._minsizes = None
+        self._prekey = None
+        self._rawminsize = None
+        self._rawprefsize = None
         self._offsets = None
         self._sizes = None
+        self._sizekey = None
     def getminsize(self):
         "Calculate the minimum size of this container"
         self._make_presizes()
-        return self._minsize
+        return self._rawminsize
     def getprefsize(self):
         "Calculate the preferred size of the container"
         self._make_presizes()
-        return self._prefsize
+        return self._rawprefsize
     def relayout(self):
         "Perform a layout refresh"
         self._make_sizes(self.size)
@@ -2543,12 +4977,6 @@ class GridContainer(Container):
         for pos, w in self._widgets.items():
             w.pos = addpos(self.pos, (ofx[pos[0]], ofy[pos[1]]))
             w.size = (szx[pos[0]], szy[pos[1]])
-    def invalidate_layout(self):
-        "Mark this widget as in need of a layout refresh"
-        Container.invalidate_layout(self)
-        self._presizes = None
-        self._minsizes = None
-        self._sizes = None
     def add(self, widget, **config):
         """
         Add a child to the container
@@ -2601,32 +5029,22 @@ class GridContainer(Container):
         self._config(self._columnConfig, col, kwds)
     def _make_presizes(self):
         "Internal layout helper"
-        if self._presizes is not None: return
-        psx, psy, msx, msy = [], [], [], []
-        for pos, w in self._widgets.items():
-            x, y = pos
-            xp1, yp1 = x + 1, y + 1
-            while len(psx) < xp1: psx.append(0)
-            while len(msx) < xp1: msx.append(0)
-            while len(psy) < yp1: psy.append(0)
-            while len(msy) < yp1: msy.append(0)
-            wps, wms = w.prefsize, w.minsize
-            psx[x] = max(psx[x], wps[0])
-            msx[x] = max(msx[x], wms[0])
-            psy[y] = max(psy[y], wps[1])
-            msy[y] = max(msy[y], wms[1])
-        for x, conf in self._columnConfig.items():
-            xp1 = x + 1
-            while len(psx) < xp1: psx.append(0)
-            while len(msx) < xp1: msx.append(0)
-            psx[x] = max(psx[x], conf['minsize'])
-            msx[x] = max(msx[x], conf['minsize'])
-        for y, conf in self._rowConfig.items():
-            yp1 = y + 1
-            while len(psy) < yp1: psy.append(0)
-            while len(msy) < yp1: msy.append(0)
-            psy[y] = max(psy[y], conf['minsize'])
-            msy[y] = max(msy[y], conf['minsize'])
+        if self._prekey == self._layout_gen: return
+        self._prekey = self._layout_gen
+        places = list(self._widgets.items())
+        prefs = [w.prefsize for p, w in places]
+        mins = [w.minsize for p, w in places]
+        # Configured row/column minimum sizes act like additional cells.
+        xs = [p[0] for p, w in places] + list(self._columnConfig)
+        ys = [p[1] for p, w in places] + list(self._rowConfig)
+        cms = [c['minsize'] for c in self._columnConfig.values()]
+        rms = [c['minsize'] for c in self._rowConfig.values()]
+        nx = max(xs) + 1 if xs else 0
+        ny = max(ys) + 1 if ys else 0
+        psx = group_max(xs, [s[0] for s in prefs] + cms, nx)
+        msx = group_max(xs, [s[0] for s in mins] + cms, nx)
+        psy = group_max(ys, [s[1] for s in prefs] + rms, ny)
+        msy = group_max(ys, [s[1] for s in mins] + rms, ny)
         lm = (LinearContainer.MODE_EQUAL,
               LinearContainer.MODE_EQUAL_FORCE)
         tps = [sum(psx), sum(psy)]
@@ -2637,11 +5055,13 @@ class GridContainer(Container):
             tps[1] = max(psy) * len(psy)
         self._presizes = (psx, psy)
         self._minsizes = (msx, msy)
-        self._prefsize = tps
-        self._minsize = tms
+        self._rawprefsize = tps
+        self._rawminsize = tms
     def _make_sizes(self, size):
         "Internal layout helper"
-        if self._sizes is not None: return
+        key = (self._layout_gen, size)
+        if self._sizekey == key: return
+        self._sizekey = key
         self._make_presizes()
         # Distribute sizes
         weights_x = [0] * len(self._presizes[0])
@@ -2664,14 +5084,7 @@ class GridContainer(Container):
             self.mode_y)
         self._sizes = (sizes_x, sizes_y)
         # Make offsets
-        ofx, ofy, x, y = [], [], 0, 0
-        for i in self._sizes[0]:
-            ofx.append(x)
-            x += i
-        for i in self._sizes[1]:
-            ofy.append(y)
-            y += i
-        self._offsets = (ofx, ofy)
+        self._offsets = (prefix_offsets(sizes_x), prefix_offsets(sizes_y))
 
 class BoxWidget(Widget):
     """
@@ -2706,47 +5119,41 @@ class BoxWidget(Widget):
                 have four items), specifies whether to draw each of the
                 top/right/bottom/left parts of the border.
         """
-        if pos[0] < 0 or pos[1] < 0 or size[0] <= 0 or size[1] <= 0:
-            return
-        try:
-            sw = win.derwin(size[1], size[0], pos[1], pos[0])
-        except _curses.error:
+        if size[0] <= 0 or size[1] <= 0:
             return
         if attr is not None:
-            sw.bkgd(ch, attr)
-            sw.clear()
+            fill_rect(win, (pos[0], pos[1], size[0], size[1]), ch, attr)
+        else:
+            attr = 0
         if border == True:
-            sw.border()
-            return
+            border = (True, True, True, True)
         elif border in (False, None):
             return
         try:
             border = tuple(border)
         except TypeError:
             border = (border, border, border, border)
-        if all(border):
-            sw.border()
-            return
-        elif not any(border):
+        if not any(border):
             return
-        # OK, this is going to be hard...
-        bottom, right = size[1] - 1, size[0] - 1
+        left, top = pos
+        right, bottom = left + size[0] - 1, top + size[1] - 1
+        b = _BACKEND
         if border[0]:
-            sw.hline(0, 0, _curses.ACS_HLINE, size[0])
+            draw_line(win, (left, top), size[0], False, b.ACS_HLINE, attr)
         if border[1]:
-            sw.vline(0, right, _curses.ACS_VLINE, size[1])
+            draw_line(win, (right, top), size[1], True, b.ACS_VLINE, attr)
         if border[2]:
-            sw.hline(bottom, 0, _curses.ACS_HLINE, size[0])
+            draw_line(win, (left, bottom), size[0], False, b.ACS_HLINE, attr)
         if border[3]:
-            sw.vline(0, 0, _curses.ACS_VLINE, size[1])
+            draw_line(win, (left, top), size[1], True, b.ACS_VLINE, attr)
         if border[0] and border[1]:
-            sw.insch(0, right, _curses.ACS_URCORNER)
+            draw_char(win, (right, top), b.ACS_URCORNER, attr)
         if border[1] and border[2]:
-            sw.insch(bottom, right, _curses.ACS_LRCORNER)
+            draw_char(win, (right, bottom), b.ACS_LRCORNER, attr)
         if border[2] and border[3]:
-            sw.addch(0, bottom, _curses.ACS_LLCORNER)
+            draw_char(win, (left, bottom), b.ACS_LLCORNER, attr)
         if border[3] and border[0]:
-            sw.addch(0, 0, _curses.ACS_ULCORNER)
+            draw_char(win, (left, top), b.ACS_ULCORNER, attr)
     def __init__(self, **kwds):
         "Initializer"
         Widget.__init__(self, **kwds)
@@ -2758,6 +5165,9 @@ class BoxWidget(Widget):
         Widget.draw_self(self, win)
         self.draw_box(win, self.pos, self.size, self.background,
                       self.background_ch, self.border)
+    def paints_background(self):
+        "Return whether a background is drawn"
+        return self.background is not None
 
 class TextWidget(Scrollable, BoxWidget):
     """
@@ -2802,9 +5212,14 @@ class TextWidget(Scrollable, BoxWidget):
         self._extra_col = False
         self._text = text
         self._lines = None
-        self._indents = None
+        self._starts = [0]
+        self._length = None
+        self._widths = None
+        self._maxwidth = None
+        self._indent_width = None
         self._vindent = None
         self._natsize = None
+        self._scroll_shift = None
         self.contentsize = (0, 0)
         self.focusable = False
     def getprefsize(self):
@@ -2817,15 +5232,91 @@ class TextWidget(Scrollable, BoxWidget):
     def _calc_lines(self):
         "Internal layout helper"
         if self._lines is None:
-            self._lines = self.text.split('\n')
+            self._lines = self._text.split('\n')
         return self._lines
+    def _has_text(self):
+        "Internal helper"
+        if self._text is not None: return bool(self._text)
+        return len(self._lines) > 1 or bool(self._lines and self._lines[0])
+    def _text_length(self):
+        "Internal helper"
+        if self._text is not None: return len(self._text)
+        if self._length is None:
+            self._length = sum(map(len, self._lines)) + len(self._lines) - 1
+        return self._length
+    def _calc_starts(self, line=None, index=None):
+        """
+        Return a list of the offsets at which the lines of the text start
+
+        The list is extended lazily (and truncated by edits); it is only
+        guaranteed to cover the line-th line (if line is not None) and the
+        line containing the index-th character (if index is not None).
+        """
+        lines, starts = self._calc_lines(), self._starts
+        k, s = len(starts), starts[-1]
+        while k < len(lines):
+            if line is not None and k > line: break
+            if index is not None and s > index: break
+            s += len(lines[k - 1]) + 1
+            starts.append(s)
+            k += 1
+        return starts
+    def _locate(self, index):
+        """
+        Convert a character index into an (x, y) position
+
+        index is clamped to the bounds of the text.
+        """
+        index = zbound(index, self._text_length())
+        starts = self._calc_starts(index=index)
+        y = _bisect.bisect_right(starts, index) - 1
+        return (index - starts[y], y)
+    def _splice(self, start, end, text):
+        """
+        Replace the text between the given positions with text
+
+        start and end are (x, y) (i.e. column/line) pairs. Only the lines
+        touched by the edit are split and joined; the text attribute is
+        recomputed from the lines when it is next accessed. The caller is
+        responsible for invoking on_textchange().
+        """
+        lines = self._calc_lines()
+        (sx, sy), (ex, ey) = start, end
+        length = self._text_length()
+        if sy != ey:
+            length -= sum(map(len, lines[sy:ey])) + ey - sy
+        self._length = length - ex + sx + len(text)
+        new = (lines[sy][:sx] + text + lines[ey][ex:]).split('\n')
+        self._update_widths(lines[sy:ey + 1], new)
+        lines[sy:ey + 1] = new
+        del self._starts[sy + 1:]
+        self._text = None
+    def _calc_width(self):
+        "Internal layout helper"
+        # The amount of lines of each length is tracked so that edits can
+        # maintain the maximum without scanning all lines.
+        if self._widths is None:
+            self._widths = _collections.Counter(map(len, self._calc_lines()))
+            self._maxwidth = max(self._widths) if self._widths else 0
+        return self._maxwidth
+    def _update_widths(self, removed, added):
+        "Internal layout helper"
+        widths = self._widths
+        if widths is None: return
+        for l in removed:
+            widths[len(l)] -= 1
+            if not widths[len(l)]: del widths[len(l)]
+        for l in added:
+            widths[len(l)] += 1
+        nw = max([0] + [len(l) for l in added])
+        if nw >= self._maxwidth:
+            self._maxwidth = nw
+        elif self._maxwidth not in widths:
+            self._maxwidth = max(widths) if widths else 0
     def _calc_metrics(self):
         "Internal layout helper"
         if self._natsize is not None: return
-        self._calc_lines()
-        ps = [0, 0]
-        if self._lines:
-            ps = [max(len(i) for i in self._lines), len(self._lines)]
+        ps = [self._calc_width(), len(self._calc_lines())]
         if self._extra_col: ps[0] += 1
         self.contentsize = tuple(ps)
         if self.border:
@@ -2833,7 +5324,7 @@ class TextWidget(Scrollable, BoxWidget):
             ps[1] += 2
         tp, ctp = self._text_prefix()
         cts, ts = self._text_suffix()
-        if self.text: tp, ts = tp + ctp, cts + ts
+        if self._has_text(): tp, ts = tp + ctp, cts + ts
         ps[0] += len(tp) + len(ts)
         self._natsize = tuple(ps)
     def _update_indents(self):
@@ -2842,20 +5333,21 @@ class TextWidget(Scrollable, BoxWidget):
         i = (1 if self.border else 0)
         tp, ctp = self._text_prefix()
         cts, ts = self._text_suffix()
-        if self._text: tp, ts = tp + ctp, cts + ts
+        if self._has_text(): tp, ts = tp + ctp, cts + ts
         size = maxpos(self._natsize, self.size)
-        ew = size[0] - len(tp) - len(ts) - 2 * i
         eh = size[1] - 2 * i
-        self._indents = tuple(int((ew - len(l)) * self.align[0])
-                              for l in self._lines)
+        self._indent_width = size[0] - len(tp) - len(ts) - 2 * i
         self._vindent = int((eh - len(self._lines)) * self.align[1])
+    def _indent(self, line):
+        "Internal layout helper"
+        return int((self._indent_width - len(line)) * self.align[0])
     def make(self):
         "Perform a layout refresh on this widget"
         BoxWidget.make(self)
         i = (1 if self.border else 0)
         tp, ctp = self._text_prefix()
         cts, ts = self._text_suffix()
-        if self._text: tp, ts = tp + ctp, cts + ts
+        if self._has_text(): tp, ts = tp + ctp, cts + ts
         self._inner_rect = (i + len(tp), i,
             self.size[0] - len(tp) - len(ts) - 2 * i,
             self.size[1] - 2 * i)
@@ -2865,39 +5357,75 @@ class TextWidget(Scrollable, BoxWidget):
         self.update_scrollbars()
     def draw_self(self, win):
         "Draw this widget to the given window"
-        BoxWidget.draw_self(self, win)
-        self.text = self._text
         i = (1 if self.border else 0)
         pref, cpref = self._text_prefix()
         csuff, suff = self._text_suffix()
-        if self._text: pref, suff = pref + cpref, csuff + suff
+        if self._has_text(): pref, suff = pref + cpref, csuff + suff
         x, y = self.pos
-        x += len(pref)
+        x += len(pref) + i
+        y += i
         w = self.size[0] - 2 * i - len(pref) - len(suff)
         h = self.size[1] - 2 * i
-        if self.textbg is None:
-            pass
-        elif self.textbg is Ellipsis:
-            self.draw_box(win, (x + i, y + i), (w, h),
-                          self.attr, self.textbgch, False)
-        else:
-            self.draw_box(win, (x + i, y + i), (w, h),
-                          self.textbg, self.textbgch, False)
-        y += self._vindent
-        if _ENCODING is None:
-            enc = lambda x: x
-        else:
-            enc = lambda x: x.encode(_ENCODING)
-        sx, sy = self.scrollpos
-        for d, l in zip(self._indents[sy:sy+h], self._lines[sy:sy+h]):
-            si, so = max(d - sx, 0), max(sx - d, 0)
-            eo = max(so + w - si, 0)
-            win.addstr(y + i, x + i + si, enc(l[so:eo]), self.attr)
-            y += 1
+        bg = (self.attr if self.textbg is Ellipsis else self.textbg)
+        # If we have only been scrolled vertically since the last redraw,
+        # shift the text that is already there, and render only the rows
+        # that have been scrolled in.
+        shift, self._scroll_shift = self._scroll_shift, 0
+        if (shift is not None and abs(shift) < h and bg is not None and
+                self._vindent == 0 and (shift == 0 or
+                scroll_window(win, (x, y, w, h), shift))):
+            for rs, re in self._exposed_rows(shift, h):
+                self.draw_box(win, (x, y + rs), (w, re - rs), bg,
+                              self.textbgch, False)
+                self._draw_lines(win, (x, y), w, rs, re)
+            return
+        BoxWidget.draw_self(self, win)
+        if bg is not None:
+            self.draw_box(win, (x, y), (w, h), bg, self.textbgch, False)
+        self._draw_lines(win, (x, y), w, 0, h)
         win.addstr(self.pos[1] + i, self.pos[0] + i, pref, self.attr)
         if suff:
             win.addstr(self.pos[1] + i + h - 1, self.pos[0] + i + w +
                        len(pref), suff, self.attr)
+    def paints_background(self):
+        "Return whether a background or the text area covers the widget"
+        if BoxWidget.paints_background(self): return True
+        bg = (self.attr if self.textbg is Ellipsis else self.textbg)
+        if bg is None or self.border: return False
+        # The prefix and the suffix cover the first and the last row only.
+        return (self.size[1] == 1 or self._inner_rect[2] == self.size[0])
+    def _exposed_rows(self, shift, height):
+        """
+        Return the rows of the text area to redraw after a scroll
+
+        shift is the amount of rows the contents have been shifted up by,
+        and height is the height of the text area. Returns a list of
+        (start, end) pairs of row indices (where end is exclusive).
+        """
+        if shift > 0:
+            return [(height - shift, height)]
+        elif shift < 0:
+            return [(0, -shift)]
+        else:
+            return []
+    def _draw_lines(self, win, pos, width, start, end):
+        "Internal drawing helper"
+        # Draws the start-th to (exclusively) end-th visible line of text
+        # into the text area at pos.
+        x, y = pos
+        sx, sy = self.scrollpos
+        y += start + self._vindent
+        lines = self._lines
+        for n in range(sy + start, min(sy + end, len(lines))):
+            l = lines[n]
+            d = self._indent(l)
+            si, so = max(d - sx, 0), max(sx - d, 0)
+            # If the content is wider than the text area (as it may be for
+            # a LogView), a short line can start beyond the right edge.
+            if si < width:
+                eo = max(so + width - si, 0)
+                _addstr(win, y, x + si, l[so:eo], self.attr)
+            y += 1
     def grab_input(self, rect, pos=None, source=None, full=False,
                    _translate=False):
         "Bring focus to the specified area"
@@ -2921,14 +5449,20 @@ class TextWidget(Scrollable, BoxWidget):
         "Mark this widget as in need of a layout refresh"
         BoxWidget.invalidate_layout(self)
         self.contentsize = None
-        self._lines = None
-        self._indents = None
+        self._indent_width = None
         self._vindent = None
         self._natsize = None
+    def invalidate(self, rec=False, child=None, rect=None):
+        "Mark this widget as in need of a redraw"
+        self._scroll_shift = None
+        BoxWidget.invalidate(self, rec, child, rect)
     def on_scroll(self, oldpos):
         "Handle the event of an external scroll"
         Scrollable.on_scroll(self, oldpos)
+        shift = self._scroll_shift
         self.invalidate()
+        if shift is not None and self.scrollpos[0] == oldpos[0]:
+            self._scroll_shift = shift + self.scrollpos[1] - oldpos[1]
     def _text_prefix(self):
         """
         Obtain the "text prefix" of this widget
@@ -2959,7 +5493,7 @@ class TextWidget(Scrollable, BoxWidget):
         """
         Handle a change of the widget's text
         """
-        self.invalidate_layout()
+        self.update_layout()
     @property
     def text(self):
         """
@@ -2968,12 +5502,41 @@ class TextWidget(Scrollable, BoxWidget):
         Assigning to this automatically updates the widget; no further steps
         are necessary.
         """
+        if self._text is None:
+            self._text = '\n'.join(self._lines)
         return self._text
     @text.setter
     def text(self, text):
-        if text == self._text: return
+        if text == self.text: return
         self._text = text
         self._lines = None
+        del self._starts[1:]
+        self._length = None
+        self._widths = None
+        self.on_textchange()
+    def append(self, text):
+        """
+        Append text to the end of the widget's text
+
+        In contrast to assigning to the text attribute, only the last line
+        of the existing text is processed, and the layout of the hierarchy
+        is only refreshed if the size of the text changes.
+        """
+        if not text: return
+        lines = self._calc_lines()
+        end = (len(lines[-1]), len(lines) - 1)
+        self._splice(end, end, text)
+        self.on_textchange()
+    def replace(self, start, end, text):
+        """
+        Replace the characters from index start to (exclusively) end
+
+        text is the string to insert instead. Only the lines affected are
+        processed; see also append().
+        """
+        if start > end: start, end = end, start
+        if start == end and not text: return
+        self._splice(self._locate(start), self._locate(end), text)
         self.on_textchange()
 
 class Label(TextWidget):
@@ -2984,6 +5547,646 @@ class Label(TextWidget):
     should be used when nothing further is desired.
     """
 
+class LogView(TextWidget):
+    """
+    A read-only view of a stream of lines of text, such as a log
+
+    Only the last capacity lines are retained; older lines are discarded as
+    new ones are appended (see append()). If the view is scrolled to the
+    end of the text, it follows newly appended lines. Appending only
+    redraws the lines that come into view, shifting the rest.
+
+    In contrast to other TextWidgets, the minimum and preferred sizes of a
+    LogView do not depend on its content (so that appending lines never
+    causes the hierarchy to be laid out anew); they are given by the
+    cminsize attribute. Bind scrollbars to make all of the content
+    reachable.
+
+    Additional attributes are:
+    capacity: The maximum amount of lines retained. Defaults to 1000.
+              Read-only.
+    follow  : Whether to follow appended lines when scrolled to the end.
+              Defaults to True.
+    """
+    def __init__(self, text='', **kwds):
+        "Initializer"
+        TextWidget.__init__(self, text, **kwds)
+        self.capacity = kwds.get('capacity', 1000)
+        self.follow = kwds.get('follow', True)
+        self._fresh = None
+    def getprefsize(self):
+        "Calculate the preferred size of this widget"
+        return self.cminsize
+    def _calc_lines(self):
+        "Internal layout helper"
+        if self._lines is None:
+            lines = self._text.split('\n') if self._text else ()
+            self._lines = _collections.deque(lines, self.capacity)
+        return self._lines
+    def make(self):
+        "Perform a layout refresh on this widget"
+        follow = (self.follow and self.scrollpos[1] >= self.maxscrollpos[1])
+        TextWidget.make(self)
+        if follow: self.scroll((self.scrollpos[0], self.maxscrollpos[1]))
+    def draw_self(self, win):
+        "Draw this widget to the given window"
+        TextWidget.draw_self(self, win)
+        self._fresh = None
+    def _exposed_rows(self, shift, height):
+        "Return the rows of the text area to redraw after a scroll"
+        ret = TextWidget._exposed_rows(self, shift, height)
+        if self._fresh is None: return ret
+        # Newly appended lines are always below the others.
+        start = zbound(self._fresh - self.scrollpos[1], height)
+        if ret and ret[0][1] == height:
+            return [(min(start, ret[0][0]), height)]
+        return ret + [(start, height)]
+    def append(self, lines):
+        """
+        Append lines to the end of the text
+
+        lines is either a single string or an iterable of strings; each
+        string forms one or more (if it contains newline characters) lines.
+        If the capacity is exceeded, the oldest lines are discarded.
+        """
+        if isinstance(lines, (str, _unicode)): lines = (lines,)
+        new = []
+        for l in lines: new.extend(l.split('\n'))
+        if not new: return
+        buf = self._calc_lines()
+        self._calc_width()
+        new = new[-self.capacity:]
+        evict = max(len(buf) + len(new) - self.capacity, 0)
+        self._update_widths([buf[i] for i in range(evict)], new)
+        buf.extend(new)
+        self._text = None
+        self._length = None
+        del self._starts[1:]
+        first = len(buf) - len(new)
+        if self._fresh is not None:
+            first = min(max(self._fresh - evict, 0), first)
+        self._fresh = first
+        # Keep the lines on display in place; their indices have shifted
+        # by evict.
+        oldpos = self.scrollpos[1]
+        follow = (self.follow and oldpos >= self.maxscrollpos[1])
+        self._natsize = None
+        self._calc_metrics()
+        if self._inner_rect is not None:
+            width, vindent = self._indent_width, self._vindent
+            self._update_indents()
+            self.maxscrollpos = maxpos(subpos(self.contentsize,
+                self._inner_rect[2:]), (0, 0))
+            # If the lines have moved horizontally or vertically, they
+            # cannot be shifted into place.
+            if ((self.align[0] != 0 and self._indent_width != width) or
+                    self._vindent != vindent):
+                self.invalidate()
+        if follow:
+            newpos = self.maxscrollpos[1]
+        else:
+            newpos = oldpos - evict
+        # Evicting the widest lines may narrow the content, so that the
+        # horizontal position has to be clamped as well.
+        oldx = self.scrollpos[0]
+        self.scrollpos[:] = minpos(maxpos((oldx, newpos), (0, 0)),
+                                   self.maxscrollpos)
+        newpos = self.scrollpos[1]
+        shift = self._scroll_shift
+        self.invalidate()
+        if shift is not None and self.scrollpos[0] == oldx:
+            self._scroll_shift = shift + newpos + evict - oldpos
+        self.update_scrollbars()
+    def replace(self, start, end, text):
+        """
+        Replace the characters from index start to (exclusively) end
+
+        Unlike for other TextWidgets, this processes the whole text.
+        """
+        if start > end: start, end = end, start
+        st = self.text
+        self.text = st[:start] + text + st[end:]
+
+class DataGrid(Scrollable, BoxWidget):
+    """
+    A scrollable table of textual cells
+
+    Instead of holding one widget per cell (as a GridContainer would), a
+    DataGrid renders the rows and columns that are currently visible
+    directly, and fetches the rows only when they are scrolled into view.
+    Thus, the cost of layout and drawing depends on the size of the
+    DataGrid instead of the amount of rows it shows.
+
+    The rows are fetched from a sequence (or a callable, or a DataSource) of
+    rows; each row is itself a sequence of cell values, one per column
+    (missing trailing cells are shown as empty). The changes a DataSource
+    notifies about are followed automatically. The columns are configured using
+    config_col(); a column is displayed at its configured width (which
+    defaults to default_width), and additional horizontal space is
+    distributed amongst the columns according to their weights. The
+    strings rendered for the cells are cached; call refresh() when the data
+    displayed change.
+
+    The scrolling position is measured in characters horizontally, and in
+    rows vertically (so that scrollpos[1] is the index of the topmost
+    visible row); scroll bars can be bound as usual. If any column has a
+    title, the titles are displayed in a header line that does not scroll
+    vertically.
+
+    The preferred height is the total height of all rows (plus the header);
+    set cmaxsize to limit it.
+
+    Attributes are:
+    rows         : The rows to display. Either a sequence of rows, a
+                   DataSource (whose rows are fetched in batches), or a
+                   callable of one argument (the index of a row) returning
+                   the corresponding row.
+    count        : The amount of rows. If None (the default), len(rows) is
+                   used; must be specified if rows is a callable. Changes
+                   take effect after invalidate_layout().
+    default_width: The width of columns whose width is not configured.
+                   Defaults to 10.
+    separator    : The string to put between adjacent columns. Defaults to a
+                   single space.
+    attr         : The attribute to display the cells with.
+    attr_header  : The attribute to display the header line with.
+    cmaxsize     : The maximum size of the DataGrid.
+    """
+    STYLE_ATTRS = {'attr': 'default', 'attr_header': 'highlight'}
+    def __init__(self, rows, count=None, **kwds):
+        "Initializer"
+        BoxWidget.__init__(self, **kwds)
+        Scrollable.__init__(self)
+        self._rows = None
+        self._cache = {}
+        self.rows = rows
+        self.count = count
+        self.default_width = kwds.get('default_width', 10)
+        self.separator = kwds.get('separator', ' ')
+        self.attr = kwds.get('attr', 0)
+        self.attr_header = kwds.get('attr_header', _curses.A_BOLD)
+        self.cmaxsize = parse_pair(kwds.get('cmaxsize'))
+        self.focusable = False
+        self._columnConfig = {}
+        self._inner_rect = None
+        self._colwidths = None
+        self._offsets = None
+        self._header = None
+        self._dirty = set()
+        self._scroll_shift = None
+        self._changed = None
+    @property
+    def rows(self):
+        """
+        The rows to display
+
+        Assigning to this discards the cached cells.
+        """
+        return self._rows
+    @rows.setter
+    def rows(self, rows):
+        if isinstance(self._rows, DataSource):
+            self._rows.unwatch(self._on_source_change)
+        self._rows = rows
+        if isinstance(rows, DataSource):
+            rows.watch(self._on_source_change)
+        self._cache.clear()
+        self.invalidate_layout()
+    def _on_source_change(self, start, end):
+        "Internal helper"
+        if self._changed is not None:
+            self._changed = min(self._changed, start)
+        if end is not None and end - start <= len(self._cache):
+            for i in range(start, end): self.refresh(i)
+            return
+        for i in [i for i in self._cache if i >= start]:
+            if end is None or i < end: del self._cache[i]
+        if end is None:
+            self.invalidate_layout()
+        else:
+            self.invalidate()
+    def config_col(self, col, **kwds):
+        """
+        Configure a column
+
+        Keyword arguments are:
+        title    : The title of the column. Defaults to None (i.e. none).
+        width    : The width of the column. Defaults to None, which means
+                   to use the default_width attribute.
+        weight   : The growing weight of the column. Defaults to zero.
+        align    : The alignment of the cells of the column. Defaults to
+                   ALIGN_LEFT.
+        formatter: A callable converting a cell value to a string. Defaults
+                   to None, which means to use "%s" formatting.
+        The amount of columns is determined by the highest index configured.
+        """
+        conf = self._columnConfig.setdefault(col, {'title': None,
+            'width': None, 'weight': 0, 'align': ALIGN_LEFT,
+            'formatter': None})
+        for k in ('title', 'width', 'weight', 'align', 'formatter'):
+            if k in kwds: conf[k] = kwds[k]
+        self._cache.clear()
+        self.invalidate_layout()
+    def _columns(self):
+        "Internal layout helper"
+        n = max(self._columnConfig) + 1 if self._columnConfig else 0
+        dflt = {'title': None, 'width': None, 'weight': 0,
+                'align': ALIGN_LEFT, 'formatter': None}
+        return [self._columnConfig.get(i, dflt) for i in range(n)]
+    def _row_count(self):
+        "Internal layout helper"
+        return len(self.rows) if self.count is None else self.count
+    def _has_header(self):
+        "Internal layout helper"
+        return any(c['title'] is not None for c in self._columns())
+    def _natural_widths(self):
+        "Internal layout helper"
+        dw = self.default_width
+        return [dw if c['width'] is None else c['width']
+                for c in self._columns()]
+    def _total_width(self, widths):
+        "Internal layout helper"
+        if not widths: return 0
+        return sum(widths) + len(self.separator) * (len(widths) - 1)
+    def getminsize(self):
+        "Obtain the minimum size of this widget"
+        i = (2 if self.border else 0)
+        hh = (1 if self._has_header() else 0)
+        return (i + min(self._total_width(self._natural_widths()), 1),
+                i + hh + min(self._row_count(), 1))
+    def getprefsize(self):
+        "Obtain the preferred size of this widget"
+        i = (2 if self.border else 0)
+        hh = (1 if self._has_header() else 0)
+        ps = (i + self._total_width(self._natural_widths()),
+              i + hh + self._row_count())
+        cm = self.cmaxsize
+        return ((ps[0] if cm[0] is None else min(ps[0], cm[0])),
+                (ps[1] if cm[1] is None else min(ps[1], cm[1])))
+    def make(self):
+        "Perform a layout refresh on this widget"
+        BoxWidget.make(self)
+        i = (1 if self.border else 0)
+        hh = (1 if self._has_header() else 0)
+        self._inner_rect = (i, i + hh, max(self.size[0] - 2 * i, 0),
+                            max(self.size[1] - 2 * i - hh, 0))
+        columns = self._columns()
+        widths = self._natural_widths()
+        total = self._total_width(widths)
+        weights = [c['weight'] for c in columns]
+        extra = self._inner_rect[2] - total
+        if extra > 0 and sum(weights) > 0:
+            widths = [w + e for w, e in zip(widths,
+                                            weight_distrib(extra, weights))]
+            total += extra
+        if widths != self._colwidths:
+            self._colwidths = widths
+            sl = len(self.separator)
+            self._offsets = prefix_offsets([w + sl for w in widths])
+            self._cache.clear()
+        if hh:
+            self._header = [self._fit(c['title'] or '', n)
+                            for n, c in enumerate(columns)]
+        else:
+            self._header = None
+        count = self._row_count()
+        self.contentsize = (total, count)
+        self.maxscrollpos = maxpos(subpos(self.contentsize,
+            self._inner_rect[2:]), (0, 0))
+        self.scrollpos[:] = minpos(self.scrollpos, self.maxscrollpos)
+        self.update_scrollbars()
+    def _format_cell(self, value, col):
+        "Internal helper"
+        conf = self._columnConfig.get(col)
+        if value is None:
+            s = ''
+        elif conf is not None and conf['formatter'] is not None:
+            s = conf['formatter'](value)
+        else:
+            s = '%s' % (value,)
+        return self._fit(s, col)
+    def _fit(self, s, col):
+        "Internal helper"
+        conf = self._columnConfig.get(col)
+        width = self._colwidths[col]
+        s = s.replace('\n', ' ')[:width]
+        d = (0 if conf is None else int((width - len(s)) * conf['align']))
+        return ' ' * d + s + ' ' * (width - len(s) - d)
+    def _cell(self, index, col):
+        "Internal helper"
+        entry = self._cache.get(index)
+        if entry is None:
+            row = (self.rows(index) if callable(self.rows) else
+                   self.rows[index])
+            entry = self._cache[index] = (row, {})
+        row, cells = entry
+        if col not in cells:
+            value = row[col] if col < len(row) else None
+            cells[col] = self._format_cell(value, col)
+        return cells[col]
+    def _load(self, start, end):
+        "Internal helper"
+        # Rows from a DataSource are fetched in one go.
+        if not isinstance(self._rows, DataSource): return
+        missing = [i for i in range(start, end) if i not in self._cache]
+        if not missing: return
+        # If the source notifies about a change while fetching, the rows
+        # from the first index changed on may be stale; they are dropped
+        # (and fetched individually by _cell()).
+        self._changed = missing[-1] + 1
+        try:
+            rows = self._rows.fetch(missing[0], missing[-1] + 1)
+        finally:
+            changed, self._changed = self._changed, None
+        del rows[max(changed - missing[0], 0):]
+        for i, row in enumerate(rows, missing[0]):
+            if i not in self._cache: self._cache[i] = (row, {})
+    def _render_row(self, cell, width):
+        "Internal drawing helper"
+        # Only the columns that intersect the visible area are rendered.
+        sx, offsets = self.scrollpos[0], self._offsets
+        first = max(_bisect.bisect_right(offsets, sx) - 1, 0)
+        last = _bisect.bisect_left(offsets, sx + width)
+        sep = self.separator
+        parts = []
+        for c in range(first, last):
+            if c != first: parts.append(sep)
+            parts.append(cell(c))
+        if offsets:
+            so = sx - offsets[first]
+            ret = ''.join(parts)[so:so + width]
+        else:
+            ret = ''
+        return ret + ' ' * (width - len(ret))
+    def draw_self(self, win):
+        "Draw this widget to the given window"
+        x, y, w, h = shiftrect(self._inner_rect, self.pos)
+        sy = self.scrollpos[1]
+        shift, self._scroll_shift = self._scroll_shift, 0
+        dirty, self._dirty = self._dirty, set()
+        # If we have only been scrolled vertically since the last redraw,
+        # shift the rows that are already there, and render only the ones
+        # that have been scrolled in (or refreshed).
+        if (shift is not None and abs(shift) < h and (shift == 0 or
+                scroll_window(win, (x, y, w, h), shift))):
+            if shift > 0:
+                rows = set(range(h - shift, h))
+            else:
+                rows = set(range(-shift))
+            rows.update(i - sy for i in dirty if sy <= i < sy + h)
+            rows = sorted(rows)
+        else:
+            BoxWidget.draw_self(self, win)
+            if self._header is not None and w > 0:
+                _addstr(win, y - 1, x, self._render_row(
+                    self._header.__getitem__, w), self.attr_header)
+            rows = range(h)
+        count = self._row_count()
+        if rows: self._load(sy + rows[0], min(sy + rows[-1] + 1, count))
+        for r in rows:
+            if sy + r < count:
+                s = self._render_row(lambda c: self._cell(sy + r, c), w)
+            else:
+                s = ' ' * w
+            _addstr(win, y + r, x, s, self.attr)
+        # Only the rows on display are retained.
+        for i in [i for i in self._cache if not sy <= i < sy + h]:
+            del self._cache[i]
+    def event(self, event):
+        "Handle an event"
+        if self.scroll_event(event, self):
+            return True
+        return BoxWidget.event(self, event)
+    def invalidate(self, rec=False, child=None, rect=None):
+        "Mark this widget as in need of a redraw"
+        self._scroll_shift = None
+        BoxWidget.invalidate(self, rec, child, rect)
+    def on_scroll(self, oldpos):
+        "Handle the event of an external scroll"
+        Scrollable.on_scroll(self, oldpos)
+        shift = self._scroll_shift
+        self.invalidate()
+        if shift is not None and self.scrollpos[0] == oldpos[0]:
+            self._scroll_shift = shift + self.scrollpos[1] - oldpos[1]
+    def refresh(self, index=None):
+        """
+        Render the row with the given index anew
+
+        If index is None, all rows are rendered anew. This should be called
+        whenever the data displayed by the rows change; only the rows on
+        display are redrawn.
+        """
+        if index is None:
+            self._cache.clear()
+            self.invalidate()
+            return
+        self._cache.pop(index, None)
+        if self._inner_rect is None: return
+        sy = self.scrollpos[1]
+        if not sy <= index < sy + self._inner_rect[3]: return
+        shift = self._scroll_shift
+        self._dirty.add(index)
+        self.invalidate()
+        self._scroll_shift = shift
+
+class FileView(Scrollable, BoxWidget):
+    """
+    A read-only view of a (potentially huge) text file
+
+    The file is accessed via a MappedFileSource, so that it is neither read
+    into memory nor split into lines as a whole: the sparse line index is
+    built incrementally (in a background thread, or, if that is disabled,
+    as the view is scrolled towards the end of the lines indexed so far),
+    and only the lines on display are decoded (using the encoding chosen by
+    init()). Scrolling vertically shifts the lines already drawn and
+    renders only the exposed ones.
+
+    Like for LogView, the minimum and preferred sizes of a FileView are
+    given by the cminsize attribute; bind scrollbars to make all of the
+    content reachable. The width of the content is that of the longest
+    line displayed so far. Tabs are expanded.
+
+    To follow a file that is being appended to (similarly to "tail -f"),
+    call poll() periodically; if the view is scrolled to the end of the
+    (fully indexed) file, it follows the lines appended. When the view is
+    not needed anymore, call close() to release the file.
+
+    Keyword arguments not listed below (encoding, stride, chunk,
+    background) are passed on to the MappedFileSource.
+
+    Attributes are:
+    source: The MappedFileSource providing the lines. Read-only.
+    attr  : The attribute to display the text with.
+    follow: Whether to follow appended lines when scrolled to the end.
+            Defaults to True.
+    """
+    STYLE_ATTRS = {'attr': 'default'}
+    def __init__(self, path, **kwds):
+        "Initializer"
+        BoxWidget.__init__(self, **kwds)
+        Scrollable.__init__(self)
+        self.attr = kwds.get('attr', 0)
+        self.follow = kwds.get('follow', True)
+        self.focusable = False
+        self.contentsize = (0, 0)
+        self._inner_rect = None
+        self._maxwidth = 0
+        self._dirty = set()
+        self._scroll_shift = None
+        self._following = False
+        self._owner = _threading.current_thread()
+        self._call = None
+        self._pending = []
+        self._pending_lock = _threading.Lock()
+        config = dict((k, kwds[k]) for k in ('stride', 'chunk', 'background')
+                      if k in kwds)
+        self.source = MappedFileSource(path, kwds.get('encoding'),
+                                       dispatch=self._dispatch, **config)
+        self.source.watch(self._on_source_change)
+    def getprefsize(self):
+        "Calculate the preferred size of this widget"
+        return self.cminsize
+    def _dispatch(self, callback, start, end):
+        "Internal helper"
+        # Notifications from the background indexer are forwarded to the
+        # thread running the main loop using the WidgetRoot make() has
+        # located (the hierarchy must not be traversed from here); until
+        # then, they are held back for make() to deliver.
+        if _threading.current_thread() is self._owner:
+            callback(start, end)
+            return
+        with self._pending_lock:
+            call = self._call
+            if call is None:
+                pending = self._pending
+                if pending and pending[-1][0] == callback:
+                    pc, ps, pe = pending.pop()
+                    start = min(start, ps)
+                    end = None if end is None or pe is None else max(end, pe)
+                pending.append((callback, start, end))
+                return
+        call(callback, start, end)
+    def _index_ahead(self):
+        "Internal helper"
+        # Without a background indexer, the lines up to a screenful beyond
+        # the bottom of the view are indexed on demand.
+        src = self.source
+        if src.background or self._inner_rect is None: return
+        need = self.scrollpos[1] + 2 * self._inner_rect[3]
+        while len(src) < need and src.scan(): pass
+    def _update_metrics(self):
+        "Internal layout helper"
+        self.contentsize = (self._maxwidth, len(self.source))
+        self.maxscrollpos = maxpos(subpos(self.contentsize,
+            self._inner_rect[2:]), (0, 0))
+    def make(self):
+        "Perform a layout refresh on this widget"
+        BoxWidget.make(self)
+        i = (1 if self.border else 0)
+        self._inner_rect = (i, i, max(self.size[0] - 2 * i, 0),
+                            max(self.size[1] - 2 * i, 0))
+        self._index_ahead()
+        self._update_metrics()
+        self.scrollpos[:] = minpos(self.scrollpos, self.maxscrollpos)
+        self.update_scrollbars()
+        root = self.parent
+        while root is not None and not isinstance(root, WidgetRoot):
+            root = root.parent
+        with self._pending_lock:
+            self._call = (None if root is None else
+                          root.call_soon_threadsafe)
+            pending, self._pending = self._pending, []
+        for callback, start, end in pending:
+            callback(start, end)
+    def draw_self(self, win):
+        "Draw this widget to the given window"
+        x, y, w, h = shiftrect(self._inner_rect, self.pos)
+        sx, sy = self.scrollpos
+        shift, self._scroll_shift = self._scroll_shift, 0
+        dirty, self._dirty = self._dirty, set()
+        # If we have only been scrolled vertically since the last redraw,
+        # shift the lines that are already there, and render only the ones
+        # that have been scrolled in (or changed).
+        if (shift is not None and abs(shift) < h and (shift == 0 or
+                scroll_window(win, (x, y, w, h), shift))):
+            if shift > 0:
+                rows = set(range(h - shift, h))
+            else:
+                rows = set(range(-shift))
+            rows.update(i - sy for i in dirty if sy <= i < sy + h)
+            rows = sorted(rows)
+        else:
+            BoxWidget.draw_self(self, win)
+            rows = range(h)
+        if not rows: return
+        lines = self.source.fetch(sy + rows[0], sy + rows[-1] + 1)
+        width = self._maxwidth
+        for r in rows:
+            n = r - rows[0]
+            l = lines[n].expandtabs() if n < len(lines) else ''
+            width = max(width, len(l))
+            l = l[sx:sx + w]
+            _addstr(win, y + r, x, l + ' ' * (w - len(l)), self.attr)
+        if width != self._maxwidth:
+            self._maxwidth = width
+            self._update_metrics()
+            self.update_scrollbars()
+    def event(self, event):
+        "Handle an event"
+        if self.scroll_event(event, self):
+            return True
+        return BoxWidget.event(self, event)
+    def invalidate(self, rec=False, child=None, rect=None):
+        "Mark this widget as in need of a redraw"
+        self._scroll_shift = None
+        BoxWidget.invalidate(self, rec, child, rect)
+    def on_scroll(self, oldpos):
+        "Handle the event of an external scroll"
+        Scrollable.on_scroll(self, oldpos)
+        shift = self._scroll_shift
+        self.invalidate()
+        if shift is not None and self.scrollpos[0] == oldpos[0]:
+            self._scroll_shift = shift + self.scrollpos[1] - oldpos[1]
+        self._following = (self.follow and self.source.indexed() and
+                           self.scrollpos[1] >= self.maxscrollpos[1])
+        self._index_ahead()
+    def _on_source_change(self, start, end):
+        "Internal helper"
+        if self._inner_rect is None: return
+        src, sy, h = self.source, self.scrollpos[1], self._inner_rect[3]
+        follow = self.follow and self._following
+        self._update_metrics()
+        # Redraw the lines on display that changed (or disappeared).
+        shift = self._scroll_shift
+        self._dirty.update(range(max(start, sy),
+                                 sy + h if end is None else min(end, sy + h)))
+        self.invalidate()
+        self._scroll_shift = shift
+        if follow or sy > self.maxscrollpos[1]:
+            self.scroll((self.scrollpos[0], self.maxscrollpos[1]))
+        # Once the end of the file has been reached, we keep following it
+        # even if the new content is indexed in several steps. Only the
+        # updated metrics tell whether the end is on display.
+        self._following = follow or (self.follow and src.indexed() and
+                                     self.scrollpos[1] >= self.maxscrollpos[1])
+        self.update_scrollbars()
+    def poll(self):
+        """
+        Check the file for new content
+
+        Returns whether the size of the file changed. See the class
+        docstring for details.
+        """
+        return self.source.poll()
+    def close(self):
+        """
+        Release the file
+
+        The view must not be drawn afterwards.
+        """
+        self.source.unwatch(self._on_source_change)
+        self.source.close()
+
 class Button(Focusable, TextWidget):
     """
     A UI element that can be focused and "invoked", performing some action
@@ -3233,7 +6436,6 @@ class EntryBox(Focusable, TextWidget):
         position.
         """
         ret = TextWidget.event(self, event)
-        st = self.text
         if event[0] == FocusEvent:
             ret |= self.focus_event(event)
         elif event[0] in (_KEY_RETURN, _curses.KEY_EOL):
@@ -3248,7 +6450,7 @@ class EntryBox(Focusable, TextWidget):
                 self.edit(delete=(-1, 0), adjust=-1, rel=True)
                 return True
         elif event[0] == _curses.KEY_DC:
-            if self.curpos[2] < len(st):
+            if self.curpos[2] < self._text_length():
                 self.edit(delete=(0, 1), rel=True)
                 return True
         elif event[0] == _curses.KEY_UP:
@@ -3264,7 +6466,7 @@ class EntryBox(Focusable, TextWidget):
                 self.edit(adjust=-1)
                 return True
         elif event[0] == _curses.KEY_RIGHT:
-            if self.curpos[2] < len(st):
+            if self.curpos[2] < self._text_length():
                 self.edit(adjust=1)
                 return True
         elif event[0] == _curses.KEY_HOME:
@@ -3293,8 +6495,8 @@ class EntryBox(Focusable, TextWidget):
                 self.edit(moveto=0)
                 return True
         elif event[0] == 5: # Ctrl-E
-            if self.curpos[2] != len(self._text):
-                self.edit(moveto=len(self._text))
+            if self.curpos[2] != self._text_length():
+                self.edit(moveto=self._text_length())
                 return True
         elif isinstance(event[0], _unicode):
             self.insert(event[0])
@@ -3304,7 +6506,7 @@ class EntryBox(Focusable, TextWidget):
         "Internal cursor positioning helper"
         if self.focused:
             x, y = self.curpos[:2]
-            x += self._indents[y]
+            x += self._indent(self._lines[y])
             y += self._vindent
             cpos = (x, y)
             if first:
@@ -3336,14 +6538,14 @@ class EntryBox(Focusable, TextWidget):
         self._calc_lines()
         if rel:
             scp = self.curpos
-            if not self._text:
+            if not self._has_text():
                 return (0, 0, 0)
             elif isinstance(value, int):
-                ni = zbound(scp[2] + value, len(self._text))
+                ni = zbound(scp[2] + value, self._text_length())
                 return self._calc_curpos(ni, xy=xy)
             elif len(value) == 3:
                 dx, dy, di = value
-                ni = zbound(scp[2] + di, len(self._text))
+                ni = zbound(scp[2] + di, self._text_length())
                 ny = zbound(scp[1] + dy, len(self._lines) - 1)
                 nx = zbound(scp[0] + dx, len(self._lines[ny]))
                 return self._calc_curpos((nx, ny, ni), xy=xy)
@@ -3354,16 +6556,13 @@ class EntryBox(Focusable, TextWidget):
                 return self._calc_curpos((nx, ny), xy=xy)
         else:
             if isinstance(value, int):
+                length = self._text_length()
                 if value < 0:
-                    value = len(self._text) - value
-                value = zbound(value, len(self._text))
+                    value = length - value
+                value = zbound(value, length)
                 if not xy:
                     return (None, None, value)
-                x, y = value, 0
-                for l in self._lines:
-                    if x <= len(l): break
-                    x -= len(l) + 1
-                    y += 1
+                x, y = self._locate(value)
                 return (x, y, value)
             else:
                 if len(value) == 3:
@@ -3375,16 +6574,11 @@ class EntryBox(Focusable, TextWidget):
                 if y < 0:
                     y = len(self._lines) - y
                 y = zbound(y, len(self._lines) - 1)
-                idx = 0
-                for n, l in enumerate(self._lines):
-                    ll = len(l)
-                    if n == y:
-                        if x < 0:
-                            x = ll - x
-                        x = zbound(x, ll)
-                        idx += x
-                        break
-                    idx += ll + 1
+                ll = len(self._lines[y])
+                if x < 0:
+                    x = ll - x
+                x = zbound(x, ll)
+                idx = self._calc_starts(line=y)[y] + x
                 if do_test and idx != test:
                     raise ValueError('Invalid cursor position')
                 return (x, y, idx)
@@ -3410,27 +6604,27 @@ class EntryBox(Focusable, TextWidget):
         depending on the sign in the latter case), or an X/Y (i.e.
         column/line) pair of coordinates.
         """
-        oldst, st = self.text, self.text
+        changed = False
         if delete is not None:
             fromval, toval = delete
-            fromidx = self._calc_curpos(fromval, rel, True)[2]
-            toidx = self._calc_curpos(toval, rel, True)[2]
-            st = st[:fromidx] + st[toidx:]
-            self._text = st
-            self._lines = None
+            frompos = self._calc_curpos(fromval, rel, True)
+            topos = self._calc_curpos(toval, rel, True)
+            if frompos[2] > topos[2]: frompos, topos = topos, frompos
+            if frompos[2] != topos[2]:
+                self._splice(frompos[:2], topos[:2], '')
+                changed = True
         if moveto is not None:
             self._curpos[:] = self._calc_curpos(moveto, rel)
-        if insert is not None:
-            cp = self._curpos[2]
-            st = st[:cp] + insert + st[cp:]
-            self._text = st
-            self._lines = None
+        if insert:
+            cp = self._calc_curpos(self._curpos[2])[:2]
+            self._splice(cp, cp, insert)
+            changed = True
         if adjust is not None:
             self._curpos[:] = self._calc_curpos(adjust, True)
         self._calc_lines()
         self._update_indents()
         self._update_curpos()
-        if st != oldst:
+        if changed:
             self.on_textchange()
         else:
             self.invalidate()
@@ -3595,25 +6789,22 @@ class Strut(BaseStrut):
         dir : The direction of the strut (a DIR_* constant).
         attr: The attribute to draw the strut with.
         """
-        # derwin()s to avoid weird character drawing glitches
+        if len <= 0: return
+        b = _BACKEND
         if dir.vert:
-            sw = win.derwin(len, 1, pos[1], pos[0])
-            sw.bkgd('\0', attr)
-            sw.clear()
-            sw.vline(0, 0, _curses.ACS_VLINE, len)
+            end = (pos[0], pos[1] + len - 1)
+            draw_line(win, pos, len, True, b.ACS_VLINE, attr)
             if dir.lo:
-                sw.addch(0, 0, _curses.ACS_TTEE)
+                draw_char(win, pos, b.ACS_TTEE, attr)
             if dir.hi:
-                sw.insch(len - 1, 0, _curses.ACS_BTEE)
+                draw_char(win, end, b.ACS_BTEE, attr)
         else:
-            sw = win.derwin(1, len, pos[1], pos[0])
-            sw.bkgd('\0', attr)
-            sw.clear()
-            sw.hline(0, 0, _curses.ACS_HLINE, len)
+            end = (pos[0] + len - 1, pos[1])
+            draw_line(win, pos, len, False, b.ACS_HLINE, attr)
             if dir.lo:
-                sw.addch(0, 0, _curses.ACS_LTEE)
+                draw_char(win, pos, b.ACS_LTEE, attr)
             if dir.hi:
-                sw.insch(0, len - 1, _curses.ACS_RTEE)
+                draw_char(win, end, b.ACS_RTEE, attr)
     def __init__(self, dir=None, **kwds):
         "Initializer"
         BaseStrut.__init__(self, dir, **kwds)
@@ -3695,24 +6886,25 @@ class Scrollbar(Focusable, BaseStrut):
         self.attr = (self.attr_active if self.focused else
             self.attr_highlight if self.highlighted else self.attr_normal)
         BaseStrut.draw_self(self, win)
-        if self.dir.vert:
+        vert, attr, b = self.dir.vert, self.attr, _BACKEND
+        if vert:
             x = self.pos[0] + int(self.size[0] * self.align[0])
-            sw = win.derwin(self.size[1], 1, self.pos[1], x)
-            sw.bkgd('\0', self.attr)
-            sw.clear()
-            if self._handle:
-                sw.vline(self._handle[0] + 1, 0, '#', self._handle[1])
-            sw.addch(0, 0, _curses.ACS_UARROW)
-            sw.insch(self.size[1] - 1, 0, _curses.ACS_DARROW)
+            start, end = (x, self.pos[1]), (x, self.pos[1] + self.size[1] - 1)
+            arrows = (b.ACS_UARROW, b.ACS_DARROW)
         else:
             y = self.pos[1] + int(self.size[1] * self.align[1])
-            sw = win.derwin(1, self.size[0], y, self.pos[0])
-            sw.bkgd('\0', self.attr)
-            sw.clear()
-            if self._handle:
-                sw.hline(0, self._handle[0] + 1, '#', self._handle[1])
-            sw.addch(0, 0, _curses.ACS_LARROW)
-            sw.insch(0, self.size[0] - 1, _curses.ACS_RARROW)
+            start, end = (self.pos[0], y), (self.pos[0] + self.size[0] - 1, y)
+            arrows = (b.ACS_LARROW, b.ACS_RARROW)
+        length = self.size[vert]
+        draw_line(win, start, length, vert, ' ', attr)
+        if self._handle:
+            hs = self._handle[0] + 1
+            hpos = (start[0], start[1] + hs) if vert else \
+                (start[0] + hs, start[1])
+            draw_line(win, hpos, min(self._handle[1], length - hs), vert,
+                      '#', attr)
+        draw_char(win, start, arrows[0], attr)
+        draw_char(win, end, arrows[1], attr)
     def event(self, event):
         """
         Handle user input events
@@ -3853,7 +7045,7 @@ class Slider(Focusable, BaseStrut):
                          self.dir, self.attr)
         if self.min != self.max:
             rp = addpos(self.pos, self._handle_pos())
-            win.addch(rp[1], rp[0], _curses.ACS_SSSS, self.attr)
+            win.addch(rp[1], rp[0], _BACKEND.ACS_SSSS, self.attr)
     def event(self, event):
         """
         Handle an input event
@@ -3926,7 +7118,7 @@ class Canvas(Widget):
         "Initializer."
         Widget.__init__(self, **kwds)
         self.padsize = padsize
-        self.pad = _curses.newpad(padsize[1], padsize[0])
+        self.pad = _BACKEND.newpad(padsize[1], padsize[0])
         self.align = parse_pair(kwds.get('align'),
                                 (ALIGN_CENTER, ALIGN_CENTER))
     def getminsize(self):
@@ -3941,9 +7133,9 @@ class Canvas(Widget):
         space = subpos(self.size, self.padsize)
         effpos = addpos(self.pos, (int(space[0] * self.align[0]),
                                    int(space[1] * self.align[1])))
-        self.pad.overwrite(win, 0, 0, effpos[1], effpos[0],
-                           effpos[1] + self.padsize[1] - 1,
-                           effpos[0] + self.padsize[0] - 1)
+        overwrite_window(self.pad, win, 0, 0, effpos[1], effpos[0],
+                         effpos[1] + self.padsize[1] - 1,
+                         effpos[0] + self.padsize[0] - 1)
     def put(self, pos, char, attr=None):
         """
         Display char at pos with the given attribute
@@ -4074,18 +7266,21 @@ class RadioGroup(BaseRadioGroup):
         if not value: return
         self._set_active(widget)
 
-def init():
+def init(backend=None):
     """
     Initialize the library
 
-    Should be called once before performing any actions.
+    Should be called once before performing any actions. backend is the
+    screen backend to use; None selects a CursesBackend, while passing a
+    HeadlessBackend allows running without a terminal.
 
     WARNING: This modifies the module's global state, and the program-wide
              locale.
     """
-    global _ENCODING
+    global _ENCODING, _BACKEND
     _locale.setlocale(_locale.LC_ALL, '')
     _ENCODING = _locale.getpreferredencoding(True)
+    _BACKEND = CursesBackend() if backend is None else backend
 
 def mainloop(scr):
     "Inner function of the debugging routine"
@@ -4155,9 +7350,9 @@ def mainloop(scr):
     cnv1 = c1.add(Canvas((6, 3), align=(ALIGN_RIGHT, ALIGN_CENTER)))
     cnv1.fill(attr=('green', 'black'), border=True)
     cnv1.put((3, 1), 'x', ('black', 'red'))
-    cnv1.put((2, 1), _curses.ACS_BULLET, ('black', 'green'))
-    cnv1.put((5, 2), _curses.ACS_LRCORNER)
-    cnv1.put((0, 0), _curses.ACS_ULCORNER)
+    cnv1.put((2, 1), _BACKEND.ACS_BULLET, ('black', 'green'))
+    cnv1.put((5, 2), _BACKEND.ACS_LRCORNER)
+    cnv1.put((0, 0), _BACKEND.ACS_ULCORNER)
     spc2 = c1.add(Widget(), weight=1)
     btne = c1.add(Button('exit', _sys.exit))
     s1 = lo.add(Strut(Strut.DIR_VERTICAL, margin=(0, 1)))
@@ -4201,7 +7396,7 @@ def mainloop(scr):
     grid.config_col(2, weight=1)
     grid.config_col(3)
     grid.config_row(1, weight=1)
-    wtc = c2.add(MarginContainer(border=1, background=_curses.color_pair(0)))
+    wtc = c2.add(MarginContainer(border=1, background=_BACKEND.color_pair(0)))
     wtlc = wtc.add(TeeContainer(align=0.25), slot=MarginContainer.POS_TOP)
     wtl = wtlc.add(Label('further widget tests'))
     wtcv = wtc.add(VerticalContainer())
@@ -0,0 +1,91 @@
+#!/usr/bin/env python3
+# -*- coding: ascii -*-
+
+"""
+Tests for the data sources and DataGrid.
+"""
+
+import os, sys
+import unittest
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(
+    __file__))))
+
+from cwidgets import *
+
+class ShiftingSource(DataSource):
+    "A data source that drops its first item when fetched from once armed"
+
+    def __init__(self, items):
+        DataSource.__init__(self)
+        self.items = items
+        self.armed = False
+
+    def __len__(self):
+        return len(self.items)
+
+    def fetch(self, start, end):
+        ret = self.items[start:end]
+        if self.armed:
+            self.armed = False
+            del self.items[0]
+            self.notify(0, None)
+        return ret
+
+class DataGridSourceTest(unittest.TestCase):
+    "Check that a DataGrid shows what its DataSource contains"
+
+    def setUp(self):
+        self.backend = HeadlessBackend((30, 8))
+        init(self.backend)
+        self.root = WidgetRoot(self.backend.initscr())
+
+    def show(self, source):
+        "Display source in a DataGrid and return the latter"
+        grid = self.root.add(DataGrid(source))
+        grid.config_col(0, width=5)
+        self.root.update()
+        return grid
+
+    def assertShows(self, grid):
+        "Ensure that the screen (even after a full redraw) matches the rows"
+        self.root.update()
+        sy, h = grid.scrollpos[1], grid._inner_rect[3]
+        expected = [str(row[0]) for row in
+                    grid.rows.fetch(sy, sy + h)]
+        for full in (False, True):
+            if full: self.root.invalidate(True)
+            self.root.update()
+            shown = [l.strip() for l in self.root.window.dump()]
+            self.assertEqual(shown[:len(expected)], expected)
+
+    def test_empty(self):
+        source = DataSource()
+        self.assertEqual(len(source), 0)
+        self.assertEqual(source.fetch(0, 10), [])
+        self.assertRaises(IndexError, source.__getitem__, 0)
+        self.show(source)
+
+    def test_iterator_capacity(self):
+        source = IteratorSource(([i] for i in range(100000)), capacity=50,
+                                prefetch=10)
+        grid = self.show(source)
+        for i in range(12):
+            grid.scroll((0, grid.scrollpos[1] + 3))
+            self.root.update()
+        self.assertEqual(len(source), 50)
+        self.assertEqual(source[0], [0])
+        self.assertShows(grid)
+        source.pull(3)
+        self.assertEqual(source[0], [3])
+        self.assertShows(grid)
+
+    def test_change_while_fetching(self):
+        source = ShiftingSource([[i] for i in range(20)])
+        grid = self.show(source)
+        source.armed = True
+        grid.scroll((0, 5))
+        self.assertShows(grid)
+        self.assertEqual(source[5], [6])
+
+if __name__ == '__main__': unittest.main()
@@ -0,0 +1,151 @@
+#!/usr/bin/env python3
+# -*- coding: ascii -*-
+
+"""
+Tests for the size distribution of LinearContainer.
+
+The reference implementation below is the original (quadratic) algorithm;
+the optimized one must return exactly the same sizes.
+"""
+
+import os, sys
+import random
+import unittest
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(
+    __file__))))
+
+from cwidgets import LinearContainer, linear_distrib, weight_distrib
+
+MODES = (LinearContainer.MODE_NORMAL, LinearContainer.MODE_STRETCH,
+         LinearContainer.MODE_EQUAL, LinearContainer.MODE_EQUAL_FORCE)
+
+def ref_make_groups(initial, mins, advances, weights, sweights):
+    "Group the items as the original implementation did"
+    glengths, gmins, gsizes, gweights, gsweights = [], [], [], [], []
+    first = True
+    for i, m, a, w, s in zip(initial, mins, advances, weights, sweights):
+        if a or first:
+            first = False
+            glengths.append(0)
+            gmins.append(0)
+            gsizes.append(0)
+            gweights.append(0)
+            gsweights.append(1)
+        glengths[-1] += 1
+        gmins[-1] = max(gmins[-1], m)
+        gsizes[-1] = max(gsizes[-1], i)
+        gweights[-1] = w
+        gsweights[-1] = s
+    return (glengths, gmins, gsizes, gweights, gsweights)
+
+def ref_unpack_groups(values, lengths):
+    "Expand per-group values as the original implementation did"
+    return sum(((v,) * l for v, l in zip(values, lengths)), ())
+
+def ref_shrink(r, full, gmins, gsweights):
+    "Shrink the groups as the original implementation did"
+    while 1:
+        indices, weights, diffs = [], [], []
+        for i, w in enumerate(gsweights):
+            if w == 0: continue
+            d = gmins[i] - r[i]
+            if d >= 0: continue
+            indices.append(i)
+            weights.append(w)
+            diffs.append(d)
+        if not indices: break
+        incs = [max(i, j) for i, j in zip(diffs,
+            weight_distrib(full - sum(r), weights))]
+        for idx, inc in zip(indices, incs):
+            r[idx] += inc
+        if sum(r) == full: break
+    return r
+
+def ref_distribute(full, initial, mins, advances, weights, sweights, mode):
+    "The original implementation of LinearContainer.distribute()"
+    if not initial: return ()
+    glengths, gmins, gsizes, gweights, gsweights = ref_make_groups(
+        initial, mins, advances, weights, sweights)
+    if mode in (LinearContainer.MODE_NORMAL, LinearContainer.MODE_STRETCH):
+        if sum(gweights) == 0:
+            if mode == LinearContainer.MODE_STRETCH:
+                gweights = (1,) * len(gweights)
+            else:
+                return ref_unpack_groups(gsizes, glengths)
+        diff = full - sum(gsizes)
+        if diff > 0:
+            incs = weight_distrib(diff, gweights)
+            r = [l + i for l, i in zip(gsizes, incs)]
+        elif diff < 0:
+            r = ref_shrink(list(gsizes), full, gmins, gsweights)
+        else:
+            r = gsizes
+        return ref_unpack_groups(r, glengths)
+    distr = linear_distrib(full, len(advances))
+    if mode != LinearContainer.MODE_EQUAL_FORCE:
+        while True:
+            if all((i <= d) for i, d in zip(initial, distr)): break
+            used, fitting = 0, []
+            for n, (i, d) in enumerate(zip(initial, distr)):
+                if i < d:
+                    fitting.append(n)
+                else:
+                    distr[n] = i
+                    used += i
+            if not fitting: break
+            ndis = linear_distrib(full - used, len(fitting))
+            for n, l in zip(fitting, ndis):
+                distr[n] = l
+        if sum(distr) > full:
+            distr = ref_shrink(distr, full, gmins, (1,) * len(gmins))
+    return ref_unpack_groups(distr, glengths)
+
+class DistributeTest(unittest.TestCase):
+    "Compare LinearContainer.distribute() against the reference"
+
+    def make_case(self, rnd, count, high):
+        "Generate random arguments for distribute()"
+        initial = [rnd.randint(0, high) for _ in range(count)]
+        mins = [rnd.randint(0, i) if rnd.random() < 0.8 else
+                rnd.randint(0, high) for i in initial]
+        if rnd.random() < 0.5:
+            advances = [1] * count
+        else:
+            advances = [rnd.choice((0, 1, 1, 1, 2)) for _ in range(count)]
+        weights = [rnd.choice((0, 0, 1, 2, 3, 7)) for _ in range(count)]
+        sweights = [rnd.choice((1, 1, 0, 2, 5)) for _ in range(count)]
+        full = rnd.randint(0, sum(initial) * 2 + 5)
+        return (full, initial, mins, advances, weights, sweights)
+
+    def check(self, rnd, count, high, iterations):
+        "Compare the results for the given amount of random cases"
+        for n in range(iterations):
+            args = self.make_case(rnd, count(), high())
+            for mode in MODES:
+                expected = ref_distribute(*(args + (mode,)))
+                result = LinearContainer.distribute(*(args + (mode,)))
+                self.assertEqual(expected, result, (args, mode))
+
+    def test_small(self):
+        rnd = random.Random(1)
+        self.check(rnd, lambda: rnd.randint(1, rnd.choice((3, 8, 30))),
+                   lambda: rnd.choice((3, 10, 100)), 2000)
+
+    def test_large(self):
+        rnd = random.Random(2)
+        self.check(rnd, lambda: rnd.randint(100, 1000),
+                   lambda: rnd.choice((1, 5, 50)), 20)
+
+    def test_many(self):
+        # Several thousand children, as in a long log or table pane. The
+        # sizes are drawn from a narrow range so that many children tie.
+        rnd = random.Random(3)
+        self.check(rnd, lambda: 5000, lambda: rnd.choice((2, 1000)), 4)
+
+    def test_empty(self):
+        for mode in MODES:
+            self.assertEqual(LinearContainer.distribute(10, [], [], [], [],
+                                                        [], mode), ())
+
+if __name__ == '__main__': unittest.main()
@@ -0,0 +1,93 @@
+#!/usr/bin/env python3
+# -*- coding: ascii -*-
+
+"""
+Tests for FileView.
+"""
+
+import os, sys
+import shutil, tempfile, time
+import unittest
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(
+    __file__))))
+
+from cwidgets import *
+
+class FileViewTest(unittest.TestCase):
+    "Check the scrolling behavior of FileView"
+
+    def setUp(self):
+        self.dir = tempfile.mkdtemp()
+        self.path = os.path.join(self.dir, 'test.txt')
+        self.write(''.join('line %d\n' % i for i in range(5000)))
+        self.backend = HeadlessBackend((40, 12))
+        init(self.backend)
+        self.root = WidgetRoot(self.backend.initscr())
+        self.view = None
+
+    def tearDown(self):
+        if self.view is not None: self.view.close()
+        self.root.close()
+        shutil.rmtree(self.dir)
+
+    def write(self, text, mode='w'):
+        "Write text to the test file"
+        with open(self.path, mode) as f:
+            f.write(text)
+
+    def open(self, **kwds):
+        "Create a FileView of the test file and display it"
+        self.view = self.root.add(FileView(self.path, cminsize=(20, 10),
+                                           chunk=4096, **kwds))
+        self.settle()
+        return self.view
+
+    def settle(self):
+        "Wait for the background indexer and update the screen"
+        self.root.update()
+        self.root._init_wakeup()
+        deadline = time.time() + 10
+        while self.view.source._thread is not None:
+            self.assertLess(time.time(), deadline)
+            time.sleep(0.001)
+        self.root._run_calls()
+        self.root.update()
+
+    def test_open_stays_at_top(self):
+        view = self.open(background=False)
+        self.assertEqual(tuple(view.scrollpos), (0, 0))
+
+    def test_open_stays_at_top_background(self):
+        view = self.open(background=True)
+        self.assertTrue(view.source.indexed())
+        self.assertEqual(tuple(view.scrollpos), (0, 0))
+
+    def test_index_before_attached(self):
+        self.view = FileView(self.path, cminsize=(20, 10), chunk=4096)
+        deadline = time.time() + 10
+        while self.view.source._thread is not None:
+            self.assertLess(time.time(), deadline)
+            time.sleep(0.001)
+        self.assertEqual(len(self.view._pending), 1)
+        self.root.add(self.view)
+        self.settle()
+        self.assertEqual(self.view._pending, [])
+        self.assertEqual(self.view.contentsize[1], 5000)
+        self.assertEqual(self.root.window.dump()[9].rstrip(), 'line 9')
+
+    def test_follow(self):
+        view = self.open(background=True)
+        view.scroll((0, view.maxscrollpos[1]))
+        self.write('appended\n', 'a')
+        view.poll()
+        self.settle()
+        self.assertEqual(len(view.source), 5001)
+        self.assertEqual(view.scrollpos[1], view.maxscrollpos[1])
+        view.scroll((0, 0))
+        self.write('more\n', 'a')
+        view.poll()
+        self.settle()
+        self.assertEqual(tuple(view.scrollpos), (0, 0))
+
+if __name__ == '__main__': unittest.main()
@@ -0,0 +1,138 @@
+#!/usr/bin/env python3
+# -*- coding: ascii -*-
+
+"""
+Tests for the incremental layout and redraw logic of cwidgets.
+"""
+
+import os, sys
+import unittest
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(
+    __file__))))
+
+from cwidgets import *
+
+class IncrementalRedrawTest(unittest.TestCase):
+    "Check that incremental updates leave the same screen as full redraws"
+
+    def setUp(self):
+        self.backend = HeadlessBackend((40, 14))
+        init(self.backend)
+        self.root = WidgetRoot(self.backend.initscr())
+
+    def assertMatchesFullRedraw(self):
+        "Ensure that a full redraw does not change the screen"
+        self.root.update()
+        incremental = self.root.window.dump(True)
+        self.root.invalidate(True)
+        self.root.update()
+        self.assertEqual(incremental, self.root.window.dump(True))
+
+    def test_shrinking_label(self):
+        mc = self.root.add(MarginContainer(border=True, background=0))
+        hc = mc.add(HorizontalContainer())
+        v1 = hc.add(VerticalContainer())
+        label = v1.add(Label('a\nlong\nlabel\nwith\nlines'))
+        v1.add(Widget(), weight=1)
+        v2 = hc.add(VerticalContainer())
+        v2.add(Label('\n'.join(str(i) for i in range(10))))
+        self.root.update()
+        label.text = 'hello'
+        self.assertMatchesFullRedraw()
+        self.assertNotIn('label', '\n'.join(self.root.window.dump()))
+
+    def test_transparent_label(self):
+        mc = self.root.add(MarginContainer(background=0))
+        vc = mc.add(VerticalContainer())
+        label = vc.add(Label('much longer text', textbg=None))
+        vc.add(Widget(), weight=1)
+        self.root.update()
+        label.text = 'short'
+        self.assertMatchesFullRedraw()
+
+    def test_viewport_shrinking_child(self):
+        vp = self.root.add(Viewport())
+        bc = vp.add(BoxContainer(margin=None, border=(0, 0, 0, 1),
+                                 padding=(0, 1)))
+        label = bc.add(Label('much longer text'))
+        self.root.update()
+        label.text = 'short'
+        self.root.update()
+        self.assertNotIn('text', '\n'.join(self.root.window.dump()))
+
+    def test_stacked_background(self):
+        sc = self.root.add(StackContainer())
+        vc = sc.add(VerticalContainer())
+        label = vc.add(Label('lower text'))
+        vc.add(Widget(), weight=1)
+        mc = sc.add(MarginContainer(background=0), layer=1)
+        mc.add(Label('top label'), slot=MarginContainer.POS_BOTTOM)
+        self.root.update()
+        label.text = 'changed'
+        self.assertMatchesFullRedraw()
+        self.assertIn('top label', self.root.window.dump()[-1])
+
+    def test_stacked_virtual_list(self):
+        sc = self.root.add(StackContainer())
+        vc = sc.add(VerticalContainer())
+        label = vc.add(Label('lower text'))
+        vc.add(Widget(), weight=1)
+        def render(widget, index):
+            widget.text = 'row %s' % index if index > 2 else ''
+        sc.add(VirtualList(10, render, background=0), layer=1)
+        self.root.update()
+        label.text = 'changed'
+        self.assertMatchesFullRedraw()
+        self.assertIn('row 9', '\n'.join(self.root.window.dump()))
+
+class BufferedRedrawTest(unittest.TestCase):
+    "Check that the frame buffer of WidgetRoot only transfers changes"
+
+    def setUp(self):
+        self.backend = HeadlessBackend((40, 14))
+        init(self.backend)
+        self.window = self.backend.initscr()
+        self.root = WidgetRoot(self.window)
+        self.root.buffered = True
+        self.writes = []
+        for name in ('addstr', 'addch'):
+            self.count_calls(name)
+
+    def count_calls(self, name):
+        "Record the calls of the given method of the screen window"
+        method = getattr(self.window, name)
+        def wrapper(*args):
+            self.writes.append(args)
+            return method(*args)
+        setattr(self.window, name, wrapper)
+
+    def build(self, root):
+        "Populate root with some widgets and return a label amongst them"
+        bc = root.add(BoxContainer(margin=0, border=True, padding=0))
+        vc = bc.add(VerticalContainer())
+        label = vc.add(Label('first line'))
+        vc.add(Label('second line'))
+        vc.add(Widget(), weight=1)
+        return label
+
+    def test_flush(self):
+        label = self.build(self.root)
+        self.root.update()
+        self.assertTrue(self.writes)
+        del self.writes[:]
+        self.root.invalidate(True)
+        self.root.update()
+        self.assertEqual(self.writes, [])
+        label.text = 'first row'
+        self.root.update()
+        self.assertEqual([args[:2] for args in self.writes], [(1, 7)])
+        # The screen matches one drawn without the buffer.
+        backend = HeadlessBackend((40, 14))
+        init(backend)
+        root = WidgetRoot(backend.initscr())
+        self.build(root).text = 'first row'
+        root.update()
+        self.assertEqual(self.window.dump(True), root.window.dump(True))
+
+if __name__ == '__main__': unittest.main()
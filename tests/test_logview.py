@@ -0,0 +1,64 @@
+#!/usr/bin/env python3
+# -*- coding: ascii -*-
+
+"""
+Tests for LogView.
+"""
+
+import os, sys
+import unittest
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(
+    __file__))))
+
+from cwidgets import *
+
+class LogViewTest(unittest.TestCase):
+    "Check the appending behavior of LogView"
+
+    def setUp(self):
+        self.backend = HeadlessBackend((20, 6))
+        init(self.backend)
+        self.root = WidgetRoot(self.backend.initscr())
+
+    def assertMatchesFullRedraw(self):
+        "Ensure that a full redraw does not change the screen"
+        self.root.update()
+        incremental = self.root.window.dump(True)
+        self.root.invalidate(True)
+        self.root.update()
+        self.assertEqual(incremental, self.root.window.dump(True))
+
+    def test_evict_widest(self):
+        view = self.root.add(LogView(capacity=2))
+        self.root.update()
+        view.append('a' * 40)
+        self.root.update()
+        view.scroll((15, 0))
+        self.root.update()
+        view.append(['short line one', 'short line two'])
+        self.assertMatchesFullRedraw()
+        self.assertEqual(tuple(view.maxscrollpos), (0, 0))
+        self.assertEqual(tuple(view.scrollpos), (0, 0))
+        self.assertEqual(self.root.window.dump()[:2],
+                         ['short line one      ', 'short line two      '])
+
+    def check_align(self, align, scroll, column):
+        "Ensure that a short line is at column when scrolled to scroll"
+        view = self.root.add(LogView(align=align))
+        self.root.update()
+        view.append(['x' * 50, 'y'])
+        self.assertMatchesFullRedraw()
+        view.scroll((scroll, 0))
+        self.assertMatchesFullRedraw()
+        row = [l for l in self.root.window.dump() if 'y' in l]
+        self.assertEqual(len(row), 1)
+        self.assertEqual(row[0].index('y'), column)
+
+    def test_align_right(self):
+        self.check_align(ALIGN_RIGHT, 30, 19)
+
+    def test_align_center(self):
+        self.check_align(ALIGN_CENTER, 20, 4)
+
+if __name__ == '__main__': unittest.main()